@@ -3,8 +3,20 @@ Sprite Animation System for Tamagotchi Game
 Handles sprite animations, backgrounds, and interactions.
 """
 
+import threading
+import time
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, compositing falls back to PIL
+    np = None
+import Trace
+from Trace import traced
+from AssetCache import get_asset_cache, background_key, cell_key
+from AssetRegistry import get_asset_registry
 
 # Sprite sheet configuration
 SPRITE_SHEET = "Assets/sprite.png"
@@ -16,6 +28,36 @@ SPRITE_Y_OFFSET = 60
 SPRITE_SHEET_FRAME_WIDTH = 64
 SPRITE_SHEET_FRAME_HEIGHT = 64
 
+# Frame cache configuration (composited frames are RGBA, 4 bytes per pixel)
+FRAME_CACHE_MAX_BYTES = 32 * 1024 * 1024
+FRAME_BYTES = BACKGROUND_WIDTH * BACKGROUND_HEIGHT * 4
+SPRITE_FRAME_BYTES = DISPLAY_FRAME_WIDTH * DISPLAY_FRAME_HEIGHT * 4
+
+# How SpriteAnimator draws: full composited frames on a label, or a canvas with a fixed
+# background item and small sprite items that swap images each frame
+RENDER_MODES = ("composite", "canvas")
+DEFAULT_RENDER_MODE = "canvas"
+
+# Trace span timing how long the animator takes to build a new state's frames (or canvas layers)
+FRAME_BUILD_SPAN = "animator.build_frames"
+
+# Display sizes baked into the pre-scaled asset cache (a change invalidates it)
+ASSET_LAYOUT = {
+    "background": [BACKGROUND_WIDTH, BACKGROUND_HEIGHT],
+    "frame": [DISPLAY_FRAME_WIDTH, DISPLAY_FRAME_HEIGHT],
+    "sheet_frame": [SPRITE_SHEET_FRAME_WIDTH, SPRITE_SHEET_FRAME_HEIGHT]
+}
+
+# Asset loader configuration
+ASSET_LOADER_WORKERS = 2
+MAX_PREFETCHED_COMPOSITES = 8
+
+# Animation speed in frames per second, per action (DEFAULT_FPS for the rest)
+DEFAULT_FPS = 10
+ACTION_FPS = {
+    "dead": 2  # Slow, low-cost loop once the pet has died
+}
+
 # Weather background images
 Weather_imgs = [
     "Assets/Weather/morning.png",      # Morning scene
@@ -48,133 +90,644 @@ ACTION_MAP = {
     "poop":   (5, 8, 1)     
 }
 
+class SpriteAtlas:
+    """
+    Process-wide cache of sprite sheet cells, sliced and scaled once.
+    Frames are shared between every animator and offscreen renderer, so callers must treat them
+    as read-only (paste them onto a copy, never draw on them directly).
+    """
+    def __init__(self, path=SPRITE_SHEET):
+        """Initialize the atlas. The sheet itself is decoded on first use."""
+        self.path = path
+        self._sheet = None
+        self._cells = {}
+        self._actions = {}
+        self._stacks = {}
+        self._lock = threading.Lock()
+
+    def _ensure_rgba(self, frame):
+        """Helper method to ensure frame is in RGBA mode."""
+        if frame.mode != 'RGBA':
+            return frame.convert('RGBA')
+        return frame
+
+    def _slice_cell(self, row, column):
+        """Crop a single cell from the sheet and scale it to display size."""
+        if self._sheet is None:
+            self._sheet = Image.open(self.path)
+            self._sheet.load()
+        # Calculate crop coordinates for sprite sizing and positioning
+        left = column * SPRITE_SHEET_FRAME_WIDTH
+        upper = row * SPRITE_SHEET_FRAME_HEIGHT
+        right = left + SPRITE_SHEET_FRAME_WIDTH
+        lower = upper + SPRITE_SHEET_FRAME_HEIGHT
+        frame = self._sheet.crop((left, upper, right, lower))
+        frame = frame.resize((DISPLAY_FRAME_WIDTH, DISPLAY_FRAME_HEIGHT), Image.Resampling.LANCZOS)
+        return self._ensure_rgba(frame)
+
+    def get_cell(self, row, column):
+        """Return the scaled RGBA frame for a sheet cell, from the asset cache when it has been built."""
+        key = (row, column)
+        cell = self._cells.get(key)
+        if cell is None:
+            with self._lock:
+                cell = self._cells.get(key)
+                if cell is None:
+                    cache = get_asset_cache(ASSET_LAYOUT) if self.path == SPRITE_SHEET else None
+                    if cache is not None and cell_key(row, column) in cache:
+                        cell = cache.get(cell_key(row, column))
+                    else:
+                        cell = self._slice_cell(row, column)
+                    self._cells[key] = cell
+        return cell
+
+    def get_frames(self, action):
+        """Return a tuple of the scaled RGBA frames for an ACTION_MAP action."""
+        frames = self._actions.get(action)
+        if frames is None:
+            row, start, count = ACTION_MAP[action]
+            frames = tuple(self.get_cell(row, i) for i in range(start, start + count))
+            self._actions[action] = frames
+        return frames
+
+    def get_stack(self, action, channels=4):
+        """
+        Return an action's frames prepared for vectorized blending onto a background with the given
+        number of channels (needs NumPy): read-only contiguous uint16 arrays of shape (N, h, w, channels)
+        holding the premultiplied pixels (rounding term included) and the inverse alpha, cropped to
+        the box where any frame is visible, and that box's (x, y) offset inside the cell.
+        """
+        key = (action, channels)
+        stack = self._stacks.get(key)
+        if stack is None:
+            frames = np.stack([np.asarray(frame) for frame in self.get_frames(action)]).astype(np.uint16)
+            # Fully transparent pixels leave the background untouched, so they are not blended at all
+            rows, columns = np.nonzero(frames[..., 3].max(axis=0))
+            if len(rows):
+                top, bottom, left, right = rows.min(), rows.max() + 1, columns.min(), columns.max() + 1
+            else:
+                top = bottom = left = right = 0
+            frames = frames[:, top:bottom, left:right]
+            alpha = frames[..., 3:4]
+            premultiplied = np.ascontiguousarray(frames[..., :channels] * alpha + 128)
+            inverse_alpha = np.ascontiguousarray(np.broadcast_to(255 - alpha, premultiplied.shape))
+            premultiplied.setflags(write=False)
+            inverse_alpha.setflags(write=False)
+            stack = self._stacks[key] = (premultiplied, inverse_alpha, (int(left), int(top)))
+        return stack
+
+    def preload(self):
+        """Slice every ACTION_MAP action up front and release the decoded sheet."""
+        for action in ACTION_MAP:
+            self.get_frames(action)
+        self._sheet = None
+
+_sprite_atlas = None
+
+def get_sprite_atlas():
+    """Return the shared SpriteAtlas, creating it on first use."""
+    global _sprite_atlas
+    if _sprite_atlas is None:
+        _sprite_atlas = SpriteAtlas()
+    return _sprite_atlas
+
+def load_background_image(background):
+    """Open a weather background and resize it to the display size (RGBA, like the asset cache)."""
+    image = Image.open(Weather_imgs[background])
+    return image.resize((BACKGROUND_WIDTH, BACKGROUND_HEIGHT)).convert("RGBA")
+
+def get_background_image(background):
+    """
+    Return a resized weather background from the shared asset registry, so each one is decoded
+    (or mapped from the asset cache) once per process however many threads ask for it.
+    """
+    key = background_key(background)
+    def load():
+        cache = get_asset_cache(ASSET_LAYOUT)
+        if cache is not None and key in cache:
+            return cache.get(key)
+        return load_background_image(background)
+    return get_asset_registry(ASSET_LAYOUT).get_image(key, load)
+
+def get_action_fps(action):
+    """Return the frame rate an action is animated at."""
+    return ACTION_FPS.get(action, DEFAULT_FPS)
+
+def get_sprite_positions(secondary_action=None):
+    """Return the top-left positions of the main sprite and of the secondary sprite."""
+    # Calculate center position for the sprite
+    x = (BACKGROUND_WIDTH - DISPLAY_FRAME_WIDTH) // 2
+    y = (BACKGROUND_HEIGHT - DISPLAY_FRAME_HEIGHT) // 2 + SPRITE_Y_OFFSET
+    # Position secondary sprite based on type (poop goes to right, food goes to left)
+    if secondary_action == "poop":
+        sec_x = x + DISPLAY_FRAME_WIDTH - 20
+    else:
+        sec_x = x - DISPLAY_FRAME_WIDTH + 20
+    return (x, y), (sec_x, y + 10)
+
+def composite_frames(background, action, secondary_action=None, atlas=None):
+    """
+    Composite the atlas frames for an action (plus an optional secondary sprite) onto a background.
+    Returns PIL images, so it works without Tk for offscreen rendering and benchmarks.
+    Uses a single vectorized NumPy pass when NumPy is installed.
+    """
+    atlas = atlas if atlas is not None else get_sprite_atlas()
+    if np is not None:
+        # RGBA frames can be wrapped without copying, RGB ones would be copied pixel by pixel
+        if background.mode != "RGBA":
+            background = background.convert("RGBA")
+        strip = composite_strip(np.asarray(background), action, secondary_action, atlas)
+        return [Image.frombuffer("RGBA", background.size, frame, "raw", "RGBA", 0, 1) for frame in strip]
+
+    frames = []
+    row, start, count = ACTION_MAP[action]
+    main_frames = atlas.get_frames(action)
+    
+    # Handle secondary action frames (like food when eating or poop when pooping)
+    secondary_frames = ()
+    if secondary_action and secondary_action in ACTION_MAP:
+        secondary_frames = atlas.get_frames(secondary_action)
+    
+    (x, y), (sec_x, sec_y) = get_sprite_positions(secondary_action)
+    
+    # Composite main action frames
+    for i, frame in zip(range(start, start + count), main_frames):
+        # Create composite image with background
+        composite = background.copy()
+        
+        # Paste the main sprite onto the background
+        composite.paste(frame, (x, y), frame)
+        
+        # If there's a secondary action, add it to the composite
+        if secondary_frames:
+            sec_frame = secondary_frames[i % len(secondary_frames)]
+            # Paste the secondary sprite onto the composite
+            composite.paste(sec_frame, (sec_x, sec_y), sec_frame)
+        
+        frames.append(composite)
+    
+    return frames
+
+def _blend_into(strip, sprites, position):
+    """Alpha-blend a get_stack() sprite stack into an (N, H, W, C) strip in place, clipped to the strip."""
+    premultiplied, inverse_alpha, (offset_x, offset_y) = sprites
+    height, width = strip.shape[1:3]
+    x, y = position[0] + offset_x, position[1] + offset_y
+    left, top = max(0, x), max(0, y)
+    right = min(width, x + premultiplied.shape[2])
+    bottom = min(height, y + premultiplied.shape[1])
+    if left >= right or top >= bottom:
+        return
+    region = strip[:, top:bottom, left:right]
+    premultiplied = premultiplied[:, top - y:bottom - y, left - x:right - x]
+    inverse_alpha = inverse_alpha[:, top - y:bottom - y, left - x:right - x]
+    # Same fixed-point rounding as PIL's paste with a mask (src * a + dst * (255 - a)) / 255
+    blended = region.astype(np.uint16)
+    blended *= inverse_alpha
+    blended += premultiplied
+    blended += blended >> 8
+    blended >>= 8
+    region[...] = blended
+
+def composite_strip(background, action, secondary_action=None, atlas=None, out=None):
+    """
+    Composite every frame of an action, plus the secondary sprite, onto a background array
+    (H, W, C) in one vectorized pass. Returns an (N, H, W, C) uint8 array, written into out
+    when a buffer of that shape is given (e.g. when rendering many pets).
+    """
+    atlas = atlas if atlas is not None else get_sprite_atlas()
+    row, start, count = ACTION_MAP[action]
+    channels = background.shape[-1]
+    sprites = atlas.get_stack(action, channels)
+    if out is None:
+        out = np.empty((count,) + background.shape, dtype=np.uint8)
+    out[...] = background
+    position, secondary_position = get_sprite_positions(secondary_action)
+    _blend_into(out, sprites, position)
+
+    # The secondary sprite cycles with the main action's sheet column, as in the PIL path
+    if secondary_action and secondary_action in ACTION_MAP:
+        premultiplied, inverse_alpha, offset = atlas.get_stack(secondary_action, channels)
+        order = [i % len(premultiplied) for i in range(start, start + count)]
+        _blend_into(out, (premultiplied[order], inverse_alpha[order], offset), secondary_position)
+    return out
+
+class AssetLoader:
+    """
+    Decodes and resizes weather backgrounds on a worker pool, and pre-composites the frames of
+    predicted scenes, so the Tk thread only picks up finished images.
+    """
+    def __init__(self, max_workers=ASSET_LOADER_WORKERS, atlas=None):
+        """Initialize the loader and its worker pool."""
+        self.atlas = atlas if atlas is not None else get_sprite_atlas()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="AssetLoader")
+        self._composites = OrderedDict() # (action, background, secondary_action) -> Future of PIL frames
+        self._lock = threading.Lock()
+
+    def get_background(self, background):
+        """Return a resized background, decoding it here only if no worker has (or is doing it)."""
+        return get_background_image(background)
+
+    def prefetch_background(self, background):
+        """Start decoding a background on the worker pool."""
+        if not get_asset_registry(ASSET_LAYOUT).has_image(background_key(background)):
+            self._executor.submit(self.get_background, background)
+
+    def _composite(self, action, background, secondary_action):
+        """Worker task: composite a scene's frames, decoding its background if needed."""
+        return composite_frames(self.get_background(background), action, secondary_action, self.atlas)
+
+    def prefetch(self, action, background, secondary_action=None):
+        """Start compositing a scene (and decoding its background) on the worker pool."""
+        key = (action, background, secondary_action)
+        with self._lock:
+            if key in self._composites:
+                return
+            self._composites[key] = self._executor.submit(self._composite, action, background, secondary_action)
+            # Drop the oldest predictions that were never used
+            while len(self._composites) > MAX_PREFETCHED_COMPOSITES:
+                self._composites.popitem(last=False)
+
+    def take_composites(self, action, background, secondary_action=None):
+        """Return (and forget) a scene's pre-composited frames if they are finished, otherwise None."""
+        key = (action, background, secondary_action)
+        with self._lock:
+            future = self._composites.get(key)
+            if future is None or not future.done():
+                return None
+            del self._composites[key]
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Failed to prefetch {key}: {e}")
+            return None
+
+    def shutdown(self):
+        """Stop the worker pool without waiting for pending work."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_asset_loader = None
+
+def get_asset_loader():
+    """Return the shared AssetLoader, creating it on first use."""
+    global _asset_loader
+    if _asset_loader is None:
+        _asset_loader = AssetLoader()
+    return _asset_loader
+
+def shutdown_asset_loader():
+    """Stop the shared AssetLoader's worker pool, if it was started. Call it when the window closes."""
+    global _asset_loader
+    if _asset_loader is not None:
+        _asset_loader.shutdown()
+        _asset_loader = None
+
+class FrameCache:
+    """Bounded LRU cache of composited frame lists keyed by (action, background, secondary_action)."""
+    def __init__(self, max_bytes=FRAME_CACHE_MAX_BYTES):
+        """Initialize the cache with a memory cap in bytes."""
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {} # Key -> bytes charged for the entry
+
+    def get(self, key):
+        """Return the cached frames for key (marking them recently used) or None."""
+        frames = self._entries.get(key)
+        if frames is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return frames
+
+    def put(self, key, frames, frame_bytes=FRAME_BYTES):
+        """Store frames for key (frame_bytes each), evicting least recently used entries to stay under the cap."""
+        if key in self._entries:
+            del self._entries[key]
+            self.current_bytes -= self._sizes.pop(key)
+        size = len(frames) * frame_bytes
+        # Never cache a single entry that is larger than the whole cache
+        if size > self.max_bytes:
+            return
+        while self._entries and self.current_bytes + size > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(evicted)
+            self.evictions += 1
+        self._entries[key] = frames
+        self._sizes[key] = size
+        self.current_bytes += size
+
+    def clear(self):
+        """Drop every cached entry (counters are kept)."""
+        self._entries.clear()
+        self._sizes.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        """Return a dictionary of cache counters."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+class FrameClock:
+    """
+    Shared frame scheduler: a single after() loop drives every subscribed animator.
+    Frames are timed against monotonic deadlines, so slow frames or timer jitter never add up.
+    """
+    def __init__(self, widget):
+        """Initialize the clock on a widget's event loop."""
+        self.widget = widget
+        self._deadlines = {} # Animator -> monotonic time of its next frame
+        self._timer = None
+        self._timer_deadline = None
+
+    def subscribe(self, animator, deadline):
+        """Ask for animator.animate(now) to be called at the given monotonic deadline."""
+        self._deadlines[animator] = deadline
+        self._reschedule()
+
+    def unsubscribe(self, animator):
+        """Stop calling an animator."""
+        if self._deadlines.pop(animator, None) is not None:
+            self._reschedule()
+
+    def _reschedule(self):
+        """Keep one timer pending for the earliest deadline."""
+        if not self._deadlines:
+            self._cancel()
+            return
+        deadline = min(self._deadlines.values())
+        if self._timer is not None and self._timer_deadline <= deadline:
+            return
+        self._cancel()
+        delay = max(0, int((deadline - time.monotonic()) * 1000))
+        self._timer = self.widget.after(delay, self._tick)
+        self._timer_deadline = deadline
+
+    def _cancel(self):
+        """Cancel the pending timer."""
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
+            self._timer_deadline = None
+
+    def _tick(self):
+        """Call every animator whose deadline has passed and schedule the next wakeup."""
+        self._timer = None
+        self._timer_deadline = None
+        now = time.monotonic()
+        for animator, deadline in list(self._deadlines.items()):
+            if deadline <= now:
+                next_deadline = animator.animate(now)
+                if next_deadline is None:
+                    self._deadlines.pop(animator, None)
+                else:
+                    self._deadlines[animator] = next_deadline
+        self._reschedule()
+
+_frame_clocks = {} # Toplevel -> its FrameClock, dropped when the toplevel is destroyed
+
+def get_frame_clock(widget):
+    """Return the FrameClock shared by every animator in widget's window."""
+    toplevel = widget.winfo_toplevel()
+    clock = _frame_clocks.get(toplevel)
+    if clock is None:
+        clock = _frame_clocks[toplevel] = FrameClock(toplevel)
+        def forget(event):
+            # Children's <Destroy> events reach the toplevel's bindings too
+            if event.widget is toplevel:
+                _frame_clocks.pop(toplevel, None)
+        toplevel.bind("<Destroy>", forget, add="+")
+    return clock
+
 class SpriteAnimator(tk.Frame):
-    """Handles sprite animation using a sprite sheet."""
-    def __init__(self, parent, action="idle", background=0, secondary_action=None):
+    """
+    Handles sprite animation using a sprite sheet. In "canvas" mode the background is a single
+    canvas item and each frame only swaps the 75x75 sprite images, in "composite" mode every frame
+    is a full-size composited image shown on a label.
+    """
+    def __init__(self, parent, action="idle", background=0, secondary_action=None, frame_cache=None, mode=DEFAULT_RENDER_MODE):
         """Initialize the SpriteAnimator."""
         super().__init__(parent)
-        self.sprite_sheet = Image.open(SPRITE_SHEET)
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {mode}")
+        self.mode = mode
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
+        self.atlas = get_sprite_atlas()
+        self.asset_loader = get_asset_loader()
+        self.frame_clock = get_frame_clock(self)
+        self.animation_start = 0.0 # Monotonic time the current animation started
+        self.is_hidden = False # Whether the window is minimized or hidden
         
         # Set background based off saved json file or default to morning
         self.background_index = background
-        self.background = Image.open(Weather_imgs[background])
-        self.background = self.background.resize((BACKGROUND_WIDTH, BACKGROUND_HEIGHT))
+        self.background = None
+        self.loaded_background_index = None
+        self.background_photo = None # Canvas background image, kept referenced while it is shown
             
         self.action = action
         self.secondary_action = secondary_action
-        self.frames = self.load_frames(action, secondary_action)
+        self.frames = self.get_frames(action, background, secondary_action)
         self.current_frame = 0
         
-        self.sprite_display = tk.Label(self)
+        if self.mode == "canvas":
+            self.sprite_display = tk.Canvas(self, width=BACKGROUND_WIDTH, height=BACKGROUND_HEIGHT,
+                                            highlightthickness=0, borderwidth=0)
+            # Stacked bottom to top: background, sprite, secondary sprite
+            self.background_item = self.sprite_display.create_image(0, 0, anchor="nw")
+            self.sprite_item = self.sprite_display.create_image(0, 0, anchor="nw")
+            self.secondary_item = self.sprite_display.create_image(0, 0, anchor="nw")
+        else:
+            self.sprite_display = tk.Label(self)
         self.sprite_display.pack(expand=True, fill='both')
         self.sprite_display.bind("<Button-1>", self.on_click)
         
-        self.animate()
-
-    def _ensure_rgba(self, frame):
-        """Helper method to ensure frame is in RGBA mode."""
-        if frame.mode != 'RGBA':
-            return frame.convert('RGBA')
-        return frame
+        # Stop animating while the window is minimized or hidden
+        toplevel = self.winfo_toplevel()
+        toplevel.bind("<Map>", self.on_map, add="+")
+        toplevel.bind("<Unmap>", self.on_unmap, add="+")
+        self.bind("<Destroy>", lambda event: self.frame_clock.unsubscribe(self), add="+")
+        
+        self.start_animation()
 
+    @traced("animator.load_frames")
     def load_frames(self, action, secondary_action=None):
-        """Load frames for a specific action from the sprite sheet."""
-        frames = []
+        """Composite the frames for a specific action and convert them to Tkinter images."""
+        # Use frames the asset loader already composited in the background when available
+        composites = self.asset_loader.take_composites(action, self.loaded_background_index, secondary_action)
+        if composites is None:
+            composites = composite_frames(self.background, action, secondary_action, self.atlas)
+        return [ImageTk.PhotoImage(composite) for composite in composites]
+
+    def load_background(self, background):
+        """Get a resized weather background from the asset loader, unless it is already loaded."""
+        if background != self.loaded_background_index:
+            self.background = self.asset_loader.get_background(background)
+            self.loaded_background_index = background
+
+    def prefetch(self, scenes):
+        """Prepare frames for likely upcoming (action, background, secondary_action) scenes off the Tk thread."""
+        for action, background, secondary_action in scenes:
+            if self.mode == "canvas":
+                # Layers never need compositing, only the background has to be decoded
+                if ("background", background) not in self.frame_cache:
+                    self.asset_loader.prefetch_background(background)
+            elif (action, background, secondary_action) not in self.frame_cache:
+                self.asset_loader.prefetch(action, background, secondary_action)
+
+    def get_background_photo(self, background):
+        """Return the background as a Tkinter image for the canvas background item."""
+        key = ("background", background)
+        photos = self.frame_cache.get(key)
+        if photos is None:
+            self.load_background(background)
+            photos = [ImageTk.PhotoImage(self.background)]
+            self.frame_cache.put(key, photos)
+        return photos[0]
+
+    def get_sprite_photos(self, action):
+        """Return an action's 75x75 sprite frames as Tkinter images."""
+        key = ("sprites", action)
+        photos = self.frame_cache.get(key)
+        if photos is None:
+            photos = [ImageTk.PhotoImage(frame) for frame in self.atlas.get_frames(action)]
+            self.frame_cache.put(key, photos, SPRITE_FRAME_BYTES)
+        return photos
+
+    def get_layers(self, action, secondary_action=None):
+        """Return (sprite, secondary sprite or None) image pairs for each frame of an action."""
         row, start, count = ACTION_MAP[action]
-        
-        # Handle secondary action frames (like food when eating or poop when pooping)
-        secondary_frames = []
-        if secondary_action and secondary_action in ACTION_MAP:
-            # Get sprite object coordinates on sprite sheet
-            sec_row, sec_start, sec_count = ACTION_MAP[secondary_action]
-            for i in range(sec_start, sec_start + sec_count):
-                # Calculate crop coordinates for sprite sizing and positioning
-                left = i * SPRITE_SHEET_FRAME_WIDTH
-                upper = sec_row * SPRITE_SHEET_FRAME_HEIGHT
-                right = left + SPRITE_SHEET_FRAME_WIDTH
-                lower = upper + SPRITE_SHEET_FRAME_HEIGHT
-                # Crop and resize the secondary sprite frame
-                frame = self.sprite_sheet.crop((left, upper, right, lower))
-                frame = frame.resize((DISPLAY_FRAME_WIDTH, DISPLAY_FRAME_HEIGHT), Image.Resampling.LANCZOS)
-                secondary_frames.append(self._ensure_rgba(frame))
-        
-        # Load main action frames
-        for i in range(start, start + count):
-            # Get sprite object coordinates on sprite sheet
-            left = i * SPRITE_SHEET_FRAME_WIDTH
-            upper = row * SPRITE_SHEET_FRAME_HEIGHT
-            right = left + SPRITE_SHEET_FRAME_WIDTH
-            lower = upper + SPRITE_SHEET_FRAME_HEIGHT
-            
-            # Crop and resize the main sprite frame
-            frame = self.sprite_sheet.crop((left, upper, right, lower))
-            frame = frame.resize((DISPLAY_FRAME_WIDTH, DISPLAY_FRAME_HEIGHT), Image.Resampling.LANCZOS)
-            
-            # Create composite image with background
-            composite = self.background.copy()
-            frame = self._ensure_rgba(frame)
-                
-            # Calculate center position for the sprite
-            x = (BACKGROUND_WIDTH - DISPLAY_FRAME_WIDTH) // 2
-            y = (BACKGROUND_HEIGHT - DISPLAY_FRAME_HEIGHT) // 2 + SPRITE_Y_OFFSET
-            
-            # Paste the main sprite onto the background
-            composite.paste(frame, (x, y), frame.split()[3])
-            
-            # If there's a secondary action, add it to the composite
-            if secondary_frames:
-                sec_frame = secondary_frames[i % len(secondary_frames)]
-                # Position secondary sprite based on type (poop goes to right, food goes to left)
-                if self.secondary_action == "poop":
-                    sec_x = x + DISPLAY_FRAME_WIDTH - 20
-                else:
-                    sec_x = x - DISPLAY_FRAME_WIDTH + 20
-                sec_y = y
-                # Paste the secondary sprite onto the composite
-                composite.paste(sec_frame, (sec_x, sec_y+10), sec_frame.split()[3])
-            
-            # Convert the composite to a Tkinter-compatible image and add to frames list
-            frames.append(ImageTk.PhotoImage(composite))
-        
+        sprites = self.get_sprite_photos(action)
+        if not (secondary_action and secondary_action in ACTION_MAP):
+            return [(sprite, None) for sprite in sprites]
+        # The secondary sprite cycles with the main action's sheet column, as in composite_frames
+        secondary = self.get_sprite_photos(secondary_action)
+        return [(sprite, secondary[i % len(secondary)]) for i, sprite in zip(range(start, start + count), sprites)]
+
+    def get_frames(self, action, background, secondary_action=None):
+        """Return the frames for a state, building and caching them on a miss."""
+        if self.mode == "canvas":
+            with Trace.span(FRAME_BUILD_SPAN):
+                # The cache may evict the background photo, the animator holds on to the one it shows
+                self.background_photo = self.get_background_photo(background)
+                return self.get_layers(action, secondary_action)
+        key = (action, background, secondary_action)
+        frames = self.frame_cache.get(key)
+        if frames is None:
+            with Trace.span(FRAME_BUILD_SPAN):
+                self.load_background(background)
+                frames = self.load_frames(action, secondary_action)
+            self.frame_cache.put(key, frames)
         return frames
 
-    def animate(self):
-        """Animate the sprite by cycling through frames."""
+    def get_fps(self):
+        """Return the frame rate of the current action."""
+        return get_action_fps(self.action)
+
+    def show_frame(self, index):
+        """Display frame index of the current animation."""
+        if self.mode == "canvas":
+            sprite, secondary = self.frames[index]
+            self.sprite_display.itemconfig(self.sprite_item, image=sprite)
+            self.sprite_display.itemconfig(self.secondary_item, image=secondary or "")
+        else:
+            self.sprite_display.config(image=self.frames[index])
+
+    def update_layers(self):
+        """Point the canvas items at the current background and the sprite positions of the current scene."""
+        self.sprite_display.itemconfig(self.background_item, image=self.background_photo)
+        position, secondary_position = get_sprite_positions(self.secondary_action)
+        self.sprite_display.coords(self.sprite_item, *position)
+        self.sprite_display.coords(self.secondary_item, *secondary_position)
+
+    def start_animation(self):
+        """Show the first frame and schedule the rest from now."""
+        self.animation_start = time.monotonic()
+        self.current_frame = 0
+        if self.mode == "canvas":
+            self.update_layers()
         if self.frames:
-            # Set current frame
-            self.sprite_display.config(image=self.frames[self.current_frame])
-            # Increment frame index
-            self.current_frame = (self.current_frame + 1) % len(self.frames)
-        # Cycle through each frame every 100ms
-        self.after(100, self.animate)
+            self.show_frame(0)
+        self.schedule_next_frame()
+
+    def schedule_next_frame(self):
+        """Subscribe to the frame clock, unless there is nothing to animate."""
+        if self.is_hidden or len(self.frames) <= 1:
+            # A single frame (or an invisible window) needs no ticking
+            self.frame_clock.unsubscribe(self)
+            return
+        period = 1 / self.get_fps()
+        elapsed_frames = int((time.monotonic() - self.animation_start) / period)
+        self.frame_clock.subscribe(self, self.animation_start + (elapsed_frames + 1) * period)
+
+    @traced("animator.animate")
+    def animate(self, now=None):
+        """
+        Show the frame due at time now and return the deadline of the next one.
+        Frames are skipped when the clock falls behind instead of slowing the animation down.
+        """
+        if self.is_hidden or len(self.frames) <= 1:
+            return None
+        now = time.monotonic() if now is None else now
+        period = 1 / self.get_fps()
+        elapsed_frames = int((now - self.animation_start) / period)
+        frame = elapsed_frames % len(self.frames)
+        if frame != self.current_frame:
+            self.show_frame(frame)
+            self.current_frame = frame
+        return self.animation_start + (elapsed_frames + 1) * period
+
+    def on_map(self, event):
+        """Resume animating when the window is shown again."""
+        if event.widget is self.winfo_toplevel() and self.is_hidden:
+            self.is_hidden = False
+            self.schedule_next_frame()
+
+    def on_unmap(self, event):
+        """Pause animating while the window is minimized or hidden."""
+        if event.widget is self.winfo_toplevel():
+            self.is_hidden = True
+            self.frame_clock.unsubscribe(self)
 
     def set_action(self, action, background, secondary_action=None):
         """Change the current animation to a different action."""
-        current_image = self.frames[self.current_frame] if self.frames else None
-        self.sprite_display.config(image=current_image)
-        self.sprite_display.update()
-        
-        # Change background if it is different from the current background
-        if background != self.background_index:
-            self.background = Image.open(Weather_imgs[background])
-            self.background = self.background.resize((BACKGROUND_WIDTH, BACKGROUND_HEIGHT))
-            self.background_index = background
+        if action not in ACTION_MAP:
+            action = self.action
+
+        # Nothing changed, keep the current animation running
+        if (action, background, secondary_action) == (self.action, self.background_index, self.secondary_action):
+            return
+
+        if self.mode == "composite":
+            current_image = self.frames[self.current_frame] if self.frames else None
+            self.sprite_display.config(image=current_image)
+            self.sprite_display.update()
         
-        # Change action if it is different from the current action
-        if action != self.action and action in ACTION_MAP:
-            self.action = action
-            
-        # Change secondary action if it is different from the current secondary action
-        if secondary_action != self.secondary_action:
-            self.secondary_action = secondary_action    
+        # Backgrounds are only opened when their frames are not cached yet
+        self.background_index = background
+        self.action = action
+        self.secondary_action = secondary_action
         
-        # Load new frames
-        self.frames = self.load_frames(self.action, self.secondary_action)
-        self.current_frame = 0
-        # Set current frame to first frame
-        if self.frames:
-            self.sprite_display.config(image=self.frames[self.current_frame])
-            self.sprite_display.update()
+        # Load new frames (a dictionary lookup for states seen before)
+        self.frames = self.get_frames(self.action, self.background_index, self.secondary_action)
+        # Restart the animation from the first frame
+        self.start_animation()
+        self.sprite_display.update()
 
     def on_click(self, event):
         """Handle click events on the sprite."""
@@ -0,0 +1,163 @@
+"""
+Pre-Scaled Asset Cache for Tamagotchi Game
+A build step decodes every asset once and writes the display-sized RGBA pixels to a single
+blob with a JSON index. At startup the blob is memory-mapped, so no PNG decoding, resizing
+or LANCZOS scaling is needed. The cache is invalidated by the content hash of its sources.
+
+Build (or rebuild) the cache with:
+    python AssetCache.py
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+from PIL import Image
+
+CACHE_DIR = "Assets/.cache"
+INDEX_FILE = "index.json"
+BLOB_FILE = "assets.rgba"
+FORMAT_VERSION = 1
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def background_key(index):
+    """Cache key of a resized weather background."""
+    return f"background:{index}"
+
+def cell_key(row, column):
+    """Cache key of a scaled sprite sheet cell."""
+    return f"cell:{row}:{column}"
+
+def image_key(path, size):
+    """Cache key of an image resized for display."""
+    return f"image:{path}:{size[0]}x{size[1]}"
+
+class AssetCache:
+    """Read-only view of a built cache, backed by a memory-mapped blob."""
+    def __init__(self, index, blob):
+        """Initialize the cache from its parsed index and mapped blob."""
+        self.index = index
+        self.entries = index["entries"]
+        self._blob = blob
+        self._view = memoryview(blob)
+
+    @classmethod
+    def open(cls, layout, cache_dir=CACHE_DIR):
+        """
+        Map the cache if it exists and matches the given layout (display sizes) and the current
+        source files, otherwise return None so callers decode the assets themselves.
+        """
+        index_path = os.path.join(cache_dir, INDEX_FILE)
+        blob_path = os.path.join(cache_dir, BLOB_FILE)
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            if index.get("version") != FORMAT_VERSION or index.get("layout") != layout:
+                return None
+            for path, source in index["sources"].items():
+                stat = os.stat(path)
+                # Unchanged size and modification time are trusted, anything else is re-hashed
+                if (stat.st_size, stat.st_mtime_ns) == (source["size"], source["mtime_ns"]):
+                    continue
+                if stat.st_size != source["size"] or file_hash(path) != source["sha256"]:
+                    return None
+            with open(blob_path, 'rb') as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(index_path):
+                print(f"Ignoring asset cache: {e}")
+            return None
+        return cls(index, blob)
+
+    def get(self, key):
+        """Return a read-only RGBA image sharing the mapped memory, or None if key is not cached."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        offset, width, height = entry["offset"], entry["width"], entry["height"]
+        buffer = self._view[offset:offset + width * height * 4]
+        return Image.frombuffer("RGBA", (width, height), buffer, "raw", "RGBA", 0, 1)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+def build(assets, layout, cache_dir=CACHE_DIR):
+    """
+    Write the cache for assets, a list of (key, source paths, render function) where the
+    render function returns the display-sized image.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    sources = {}
+    entries = {}
+    blob_path = os.path.join(cache_dir, BLOB_FILE)
+    with open(blob_path + ".tmp", 'wb') as blob:
+        offset = 0
+        for key, paths, render in assets:
+            image = render().convert("RGBA")
+            data = image.tobytes()
+            blob.write(data)
+            entries[key] = {"offset": offset, "width": image.width, "height": image.height}
+            offset += len(data)
+            for path in paths:
+                if path not in sources:
+                    stat = os.stat(path)
+                    sources[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_hash(path)}
+    index = {"version": FORMAT_VERSION, "layout": layout, "sources": sources, "entries": entries}
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    with open(index_path + ".tmp", 'w') as f:
+        json.dump(index, f)
+    # The index is replaced last, so a reader never sees it pointing into an older blob
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+_asset_caches = {} # Layout -> (index file modification time, AssetCache or None)
+_asset_caches_lock = threading.Lock()
+
+def get_asset_cache(layout):
+    """
+    Return the shared AssetCache for a layout, or None if no valid cache has been built.
+    The cache is opened again whenever its index file changes, so a cache built while the game runs is picked up.
+    """
+    key = json.dumps(layout, sort_keys=True)
+    try:
+        version = os.stat(os.path.join(CACHE_DIR, INDEX_FILE)).st_mtime_ns
+    except OSError:
+        version = None
+    with _asset_caches_lock:
+        entry = _asset_caches.get(key)
+        if entry is None or entry[0] != version:
+            entry = _asset_caches[key] = (version, AssetCache.open(layout) if version is not None else None)
+        return entry[1]
+
+def main(argv=None):
+    # Imported here so loading the cache never pulls in the UI modules
+    from Animate import ACTION_MAP, ASSET_LAYOUT, Weather_imgs, SPRITE_SHEET, SpriteAtlas, load_background_image
+    from View import CACHED_IMAGES
+
+    atlas = SpriteAtlas()
+    assets = []
+    for index, path in enumerate(Weather_imgs):
+        assets.append((background_key(index), [path], lambda index=index: load_background_image(index)))
+    cells = sorted({(row, column) for row, start, count in ACTION_MAP.values() for column in range(start, start + count)})
+    for row, column in cells:
+        assets.append((cell_key(row, column), [SPRITE_SHEET], lambda row=row, column=column: atlas._slice_cell(row, column)))
+    for path, size in CACHED_IMAGES:
+        assets.append((image_key(path, size), [path], lambda path=path, size=size: Image.open(path).resize(size, Image.Resampling.LANCZOS)))
+
+    index = build(assets, ASSET_LAYOUT)
+    size = os.path.getsize(os.path.join(CACHE_DIR, BLOB_FILE))
+    print(f"Built {len(index['entries'])} assets ({size / 1024 / 1024:.1f} MB) in {CACHE_DIR}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
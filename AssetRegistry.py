@@ -0,0 +1,171 @@
+"""
+Asset Registry System for Tamagotchi Game
+Decodes each image file once and shares it between the View and Animate. Display objects derived
+from the images (CTkImage, PhotoImage) are cached per size and reference-counted: released entries
+are kept in a small pool for reuse, and the least recently released ones are dropped past its limit,
+along with their decoded source image once nothing else holds it.
+"""
+
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+from AssetCache import get_asset_cache, image_key
+
+MAX_UNUSED = 16 # Released display objects kept for reuse
+
+class AssetRegistry:
+    """Process-wide cache of decoded images and the display objects derived from them."""
+    def __init__(self, layout, max_unused=MAX_UNUSED):
+        """Initialize the registry for the asset cache layout (display sizes)."""
+        self.layout = layout
+        self.max_unused = max_unused
+        self._images = {} # Key -> decoded PIL image
+        self._image_locks = {} # Key -> lock held while the image is decoded
+        self._image_refs = {} # Key -> holders of an acquired image
+        self._pinned = set() # Keys of images fetched with get_image, kept for the life of the process
+        self._entries = {} # (kind, path, size) -> [display object, reference count, source image key]
+        self._owners = {} # id(display object) -> entry key
+        self._unused = OrderedDict() # Entry keys with no references, least recently released first
+        self._lock = threading.Lock()
+        self.decodes = 0
+        self.hits = 0
+
+    def _load_image(self, key, loader):
+        """Return the image stored under key, decoding it with loader() if it is not stored."""
+        image = self._images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        with self._lock:
+            lock = self._image_locks.setdefault(key, threading.Lock())
+        with lock:
+            image = self._images.get(key)
+            if image is None:
+                image = loader()
+                image.load()
+                self._images[key] = image
+                self.decodes += 1
+        return image
+
+    def get_image(self, key, loader):
+        """
+        Return the image stored under key, calling loader() to decode it the first time.
+        Threads asking for the same image at once wait for a single decode. The image is kept
+        for the life of the process, use acquire_image() for one that should be freed.
+        """
+        image = self._load_image(key, loader)
+        with self._lock:
+            self._pinned.add(key)
+        return image
+
+    def acquire_image(self, key, loader):
+        """Return the image stored under key like get_image(), adding a reference. Call release_image() when done."""
+        image = self._load_image(key, loader)
+        with self._lock:
+            self._image_refs[key] = self._image_refs.get(key, 0) + 1
+        return image
+
+    def release_image(self, key):
+        """Drop a reference to an acquired image, freeing it once nothing holds it."""
+        with self._lock:
+            count = self._image_refs.get(key, 0) - 1
+            if count > 0:
+                self._image_refs[key] = count
+                return
+            self._image_refs.pop(key, None)
+            if key not in self._pinned:
+                self._images.pop(key, None)
+
+    def has_image(self, key):
+        """Return whether the image under key has been decoded."""
+        return key in self._images
+
+    def _source(self, path, size):
+        """Return the key and loader of the image for showing path at size: pre-scaled from the asset cache when built, otherwise the file."""
+        cache = get_asset_cache(self.layout)
+        key = image_key(path, size)
+        if cache is not None and key in cache:
+            return key, lambda: cache.get(key)
+        return path, lambda: Image.open(path)
+
+    def _acquire(self, key, source, factory):
+        """
+        Return the display object for key, creating it with factory(source image) on first use,
+        and add a reference to it. The source image is held for as long as the display object is kept.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self._unused.pop(key, None)
+                return entry[0]
+        source_key, loader = source
+        value = factory(self.acquire_image(source_key, loader))
+        with self._lock:
+            entry = self._entries.setdefault(key, [value, 0, source_key])
+            entry[1] += 1
+            self._unused.pop(key, None)
+            self._owners[id(entry[0])] = key
+            created = entry[0] is value
+        if not created:
+            # Another thread created it first
+            self.release_image(source_key)
+        return entry[0]
+
+    def acquire_ctk_image(self, path, size):
+        """Return a shared CTkImage of path at size. Call release() once the widget no longer shows it."""
+        import customtkinter as ctk
+        return self._acquire(("ctk", path, tuple(size)), self._source(path, size), lambda image: ctk.CTkImage(image, size=size))
+
+    def acquire_photo_image(self, path, size):
+        """Return a shared Tk PhotoImage of path resized to size. Call release() once it is no longer shown."""
+        from PIL import ImageTk
+        def create(image):
+            if image.size != tuple(size):
+                image = image.resize(size, Image.Resampling.LANCZOS)
+            return ImageTk.PhotoImage(image)
+        return self._acquire(("photo", path, tuple(size)), self._source(path, size), create)
+
+    def release(self, image):
+        """Drop a reference to a display object returned by an acquire method."""
+        freed = []
+        with self._lock:
+            key = self._owners.get(id(image))
+            entry = self._entries.get(key)
+            if entry is None or entry[1] == 0:
+                return
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._unused[key] = None
+                # Only the least recently released entries past the limit are freed
+                while len(self._unused) > self.max_unused:
+                    stale, _ = self._unused.popitem(last=False)
+                    value, _, source_key = self._entries.pop(stale)
+                    del self._owners[id(value)]
+                    freed.append(source_key)
+        for source_key in freed:
+            self.release_image(source_key)
+
+    def stats(self):
+        """Return decode, hit and entry counts."""
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "pinned": len(self._pinned),
+                "decodes": self.decodes,
+                "hits": self.hits,
+                "entries": len(self._entries),
+                "unused": len(self._unused)
+            }
+
+_asset_registry = None
+_asset_registry_lock = threading.Lock()
+
+def get_asset_registry(layout):
+    """Return the shared AssetRegistry, creating it on first use."""
+    global _asset_registry
+    with _asset_registry_lock:
+        if _asset_registry is None:
+            _asset_registry = AssetRegistry(layout)
+        return _asset_registry
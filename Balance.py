@@ -0,0 +1,201 @@
+"""
+Balancing Simulation System for Tamagotchi Game
+Runs Monte Carlo lifetimes of many pets under care policies (e.g. "feed every 4 ticks, never
+clean the poop") with the game's own stat rules, sharded across a process pool, and reports
+the lifespan, time-to-death and mood-occupancy distributions. Any rule table param (such as
+the overweight and old-age thresholds) can be changed to see how a tweak shifts the balance.
+
+Usage:
+    python Balance.py --pets 1000000 --policy attentive --policy never_clean
+    python Balance.py --policy feed=3,dance=6,clean=1 --overweight 300 --old-age 80
+    python Balance.py --rules my_rules.json --param poop_threshold=60
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Herd import Herd
+from Model import DataManager, Model
+from Rules import RULES, RuleSet, load_rules
+
+# Care actions a policy can schedule -> Herd method
+ACTIONS = {
+    "feed": "feed",
+    "dance": "dance",
+    "sleep": "sleep",
+    "dice": "random_event",
+    "clean": "clean_poop"
+}
+
+# Named policies: action -> ticks between uses (missing actions are never used)
+POLICIES = {
+    "neglect": {},
+    "feed_only": {"feed": 4},
+    "never_clean": {"feed": 4, "dance": 4, "sleep": 8},
+    "attentive": {"feed": 4, "dance": 4, "sleep": 8, "clean": 1},
+    "gambler": {"feed": 4, "dice": 2, "clean": 2}
+}
+
+PERCENTILES = (5, 25, 50, 75, 95)
+MOOD_NAMES = ("happy", "middle", "angry", "sad")
+
+SHARD_SIZE = 50000 # Pets simulated together in one worker task
+MAX_TICKS = 24 * 3600 // Model.UPDATE_INTERVAL # Pets still alive after a day of ticks are counted as surviving
+
+def parse_policy(spec):
+    """Return the {action: ticks} schedule for a policy name or an "action=ticks,..." spec."""
+    if spec in POLICIES:
+        return dict(POLICIES[spec])
+    policy = {}
+    for item in filter(None, spec.split(",")):
+        action, _, every = item.partition("=")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action in policy: {action}")
+        try:
+            every = int(every)
+        except ValueError:
+            raise ValueError(f"Policy action needs a tick count: {item}") from None
+        if every > 0: # 0 means never
+            policy[action] = every
+    return policy
+
+def parse_params(items):
+    """Return {param: value} from "name=value" strings."""
+    params = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        try:
+            params[name] = int(value)
+        except ValueError:
+            raise ValueError(f"Param needs an integer value: {item}") from None
+    return params
+
+def simulate_shard(policy, pets, seed, max_ticks=MAX_TICKS, table=None, params=None):
+    """
+    Simulate one shard of fresh pets until they all die or max_ticks pass, following the rule
+    table (the built-in one by default) with params overridden.
+    Each tick the policy's due actions are applied to the living pets, then the stats update.
+    Returns the lifespans in ticks (-1 for survivors) and the mood counts over the living ticks.
+    """
+    herd = Herd.from_states([DataManager().default_data] * pets, seed=seed, rules=RuleSet(table, params))
+    lifespans = np.full(pets, -1, dtype=np.int32)
+    mood_ticks = np.zeros(len(MOOD_NAMES), dtype=np.int64)
+    living = np.flatnonzero(herd.is_alive)
+    for tick in range(1, max_ticks + 1):
+        if not len(living):
+            break
+        for action, every in policy.items():
+            if tick % every == 0:
+                getattr(herd, ACTIONS[action])(living)
+        herd.update_stats(living)
+        alive = herd.is_alive[living]
+        lifespans[living[~alive]] = tick
+        living = living[alive]
+        mood_ticks += np.bincount(herd.mood[living], minlength=len(MOOD_NAMES))[:len(MOOD_NAMES)]
+    return lifespans, mood_ticks
+
+def _simulate_shard(args):
+    return simulate_shard(*args)
+
+def summarize(values):
+    """Return the mean and percentiles of an array of numbers."""
+    if not len(values):
+        return None
+    summary = {"mean": round(float(values.mean()), 2)}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = round(float(value), 2)
+    return summary
+
+def run_policy(policy, pets, seed=None, workers=None, max_ticks=MAX_TICKS, table=None, params=None,
+               shard_size=SHARD_SIZE, bins=10):
+    """
+    Simulate pets lifetimes under a policy on a process pool and return their distributions.
+    The same seed always gives the same results, whatever the number of workers. No pets gives an empty report.
+    """
+    RuleSet(table, params) # Fail on a bad table here rather than in every worker
+    if pets < 0 or shard_size <= 0 or max_ticks <= 0:
+        raise ValueError("pets can't be negative, shard_size and max_ticks must be positive")
+    shards = [min(shard_size, pets - start) for start in range(0, pets, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    tasks = [(policy, size, shard_seed, max_ticks, table, params) for size, shard_seed in zip(shards, seeds)]
+    results = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_simulate_shard, tasks))
+
+    # No pets gives an empty report
+    lifespans = np.concatenate([np.zeros(0, dtype=np.int32)] + [shard_lifespans for shard_lifespans, _ in results])
+    mood_ticks = sum((shard_mood_ticks for _, shard_mood_ticks in results), np.zeros(len(MOOD_NAMES), dtype=np.int64))
+    died = lifespans[lifespans >= 0]
+    counts, edges = np.zeros(0), np.zeros(0)
+    if len(died):
+        # Lifespans are whole ticks, so the bins get whole-tick edges
+        edges = np.unique(np.linspace(died.min(), died.max() + 1, bins + 1).astype(np.int64))
+        counts, edges = np.histogram(died, bins=edges)
+    living_ticks = int(mood_ticks.sum())
+    return {
+        "pets": pets,
+        "survived": int(pets - len(died)),
+        "lifespan_ticks": summarize(died),
+        "time_to_death_hours": summarize(died * Model.UPDATE_INTERVAL / 3600),
+        "lifespan_histogram": {"edges": edges.astype(int).tolist(), "counts": counts.astype(int).tolist()},
+        "mood_occupancy": {name: round(int(count) / living_ticks, 4) if living_ticks else 0.0 for name, count in zip(MOOD_NAMES, mood_ticks)}
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balancing of Tamagotchi pet lifetimes.")
+    parser.add_argument("--pets", type=int, default=100000, help="lifetimes to simulate per policy")
+    parser.add_argument("--policy", action="append", help=f"{', '.join(POLICIES)} or action=ticks,... (repeatable)")
+    parser.add_argument("--seed", type=int, default=1234, help="random seed")
+    parser.add_argument("--workers", type=int, help="worker processes (one per CPU by default)")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS, help="ticks after which a living pet counts as surviving")
+    parser.add_argument("--rules", help="JSON rule table to use instead of the built-in one")
+    parser.add_argument("--param", action="append", default=[], help="override a rule table param, e.g. poop_threshold=60 (repeatable)")
+    parser.add_argument("--overweight", type=int, help="weight above which health decays faster")
+    parser.add_argument("--old-age", type=int, help="age above which health decays faster")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="pets per worker task")
+    parser.add_argument("-o", "--output", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    for name in ("pets", "shard_size", "max_ticks"):
+        if getattr(args, name) <= 0:
+            parser.error(f"--{name.replace('_', '-')} must be positive")
+
+    try:
+        policies = {spec: parse_policy(spec) for spec in args.policy or ["neglect", "never_clean", "attentive"]}
+        table = load_rules(args.rules) if args.rules else RULES
+        params = parse_params(args.param)
+        if args.overweight is not None:
+            params["overweight"] = args.overweight
+        if args.old_age is not None:
+            params["old_age"] = args.old_age
+        rules = RuleSet(table, params)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    report = {
+        "settings": {"pets": args.pets, "seed": args.seed, "max_ticks": args.max_ticks, "rules": args.rules or "built-in",
+                     "params": rules.params, "workers": args.workers or os.cpu_count()},
+        "policies": {}
+    }
+    for spec, policy in policies.items():
+        start = time.perf_counter()
+        results = run_policy(policy, args.pets, args.seed, args.workers, args.max_ticks, table, params, args.shard_size)
+        results["policy"] = policy
+        results["seconds"] = round(time.perf_counter() - start, 2)
+        report["policies"][spec] = results
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Benchmark Suite for Tamagotchi Game
+Times the render, tick and persistence hot paths without a display and compares
+the results against a stored baseline.
+
+Usage:
+    python Bench.py                                  # run and print JSON results
+    python Bench.py --output results.json            # also write the results to a file
+    python Bench.py --save-baseline                  # store the results as the new baseline
+    python Bench.py --baseline bench_baseline.json --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from Animate import ACTION_MAP, Weather_imgs, FrameCache, composite_frames, get_sprite_atlas, load_background_image
+from Model import Model, DataManager
+
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.10 # Allowed slowdown of the median before a benchmark counts as a regression
+SEED = 1234 # Seeds every pet's random stream, so runs draw the same stat changes
+
+# Secondary sprites shown next to the pet: none, food while eating, poop
+SECONDARY_ACTIONS = [None, "oniguri", "dessert", "poop"]
+
+def percentile(samples, fraction):
+    """Return the given percentile (0-1) of a list of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples):
+    """Summarize per-call durations in milliseconds."""
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 0.50),
+        "p95_ms": percentile(samples, 0.95),
+        "min_ms": min(samples),
+        "max_ms": max(samples)
+    }
+
+def time_calls(func, repeat):
+    """Call func repeat times and return each call's duration in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def bench_load_background(repeat):
+    """Decode and resize every weather background."""
+    samples = []
+    for _ in range(max(1, repeat // 10)):
+        for index in range(len(Weather_imgs)):
+            samples.extend(time_calls(lambda: load_background_image(index), 1))
+    return summarize(samples)
+
+def bench_composite(repeat):
+    """Composite every ACTION_MAP action x weather background x secondary action."""
+    atlas = get_sprite_atlas()
+    atlas.preload()
+    backgrounds = [load_background_image(index) for index in range(len(Weather_imgs))]
+    samples = []
+    for _ in range(max(1, repeat // 50)):
+        for action in ACTION_MAP:
+            for background in backgrounds:
+                for secondary_action in SECONDARY_ACTIONS:
+                    samples.extend(time_calls(lambda: composite_frames(background, action, secondary_action, atlas), 1))
+    return summarize(samples)
+
+def bench_update_stats(repeat):
+    """Run Model.update_stats, keeping the pet young and healthy so every call does the full update."""
+    model = Model(lambda changes: None, rng=random.Random(SEED))
+    def tick():
+        model.age = 1
+        model.health = 100
+        model.is_alive = True
+        model.update_stats()
+    results = summarize(time_calls(tick, repeat * 10))
+    results["ops_per_sec"] = 1000 / results["mean_ms"]
+    model.stop()
+    return results
+
+def bench_save_data(repeat):
+    """Write the save file."""
+    data_manager = DataManager()
+    data = dict(data_manager.default_data)
+    return summarize(time_calls(lambda: data_manager.save_data(data), repeat))
+
+def bench_load_data(repeat):
+    """Read the save file."""
+    data_manager = DataManager()
+    data_manager.save_data(data_manager.default_data)
+    return summarize(time_calls(data_manager.load_data, repeat))
+
+class HeadlessView:
+    """Observer that follows View.update_view's data path (stats, sprite state, frames) minus the widgets."""
+    def __init__(self, model):
+        self.model = model
+        self.frame_cache = FrameCache()
+        self.backgrounds = {}
+
+    def update_view(self, changes=None):
+        pet_stats = self.model.get_pet()
+        # Same label text work as the real view
+        labels = (pet_stats["name"], f"Yrs:{pet_stats['age']}", f"Lbs:{pet_stats['weight']}", pet_stats["health"] / 100)
+        secondary_action = self.model.get_secondary_action()
+        action = pet_stats["action"] if pet_stats["is_alive"] else "dead"
+        if pet_stats["is_alive"] and pet_stats["poop_visible"] and not secondary_action:
+            secondary_action = "poop"
+        key = (action, pet_stats["background"], secondary_action)
+        if self.frame_cache.get(key) is None:
+            background = self.backgrounds.get(key[1])
+            if background is None:
+                background = self.backgrounds[key[1]] = load_background_image(key[1])
+            self.frame_cache.put(key, composite_frames(background, action, secondary_action))
+        return labels
+
+def bench_notify_cycle(repeat):
+    """A Model setter through the Observer to a headless update_view, cycling through actions."""
+    view = None
+    model = Model(lambda changes: view.update_view(changes), rng=random.Random(SEED))
+    view = HeadlessView(model)
+    actions = ["eat", "happy", "dance", "happy", "sleep", "happy"]
+    step = [0]
+    def notify():
+        step[0] += 1
+        model.set_action(actions[step[0] % len(actions)], "oniguri" if step[0] % 3 == 0 else None)
+    results = summarize(time_calls(notify, repeat))
+    results["frame_cache"] = view.frame_cache.stats()
+    model.stop()
+    return results
+
+BENCHMARKS = {
+    "load_background": bench_load_background,
+    "composite_frames": bench_composite,
+    "update_stats": bench_update_stats,
+    "save_data": bench_save_data,
+    "load_data": bench_load_data,
+    "notify_cycle": bench_notify_cycle
+}
+
+def run_benchmarks(names=None, repeat=200):
+    """Run the named benchmarks (all by default) in a scratch directory and return the results."""
+    assets = os.path.abspath("Assets")
+    previous_dir = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="tamagotchi-bench-")
+    # Saves land in the scratch directory, assets are read through a link to the real ones
+    os.symlink(assets, os.path.join(scratch, "Assets"))
+    os.chdir(scratch)
+    try:
+        results = {}
+        for name in names or BENCHMARKS:
+            results[name] = BENCHMARKS[name](repeat)
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "benchmarks": results
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return {name: ratio} for benchmarks whose median slowed down by more than threshold."""
+    regressions = {}
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or previous["p50_ms"] <= 0:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"]
+        current["baseline_ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Tamagotchi hot paths.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=200, help="samples per benchmark")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed median slowdown, e.g. 0.10 for 10%%")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat)
+    regressions = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output)
+
+    for name, ratio in regressions.items():
+        print(f"REGRESSION {name}: median is {ratio:.2f}x the baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Clock and Scheduler System for Tamagotchi Game
+Lets the Controller schedule ticks and animations without depending on Tk,
+so the game rules can also run headless in virtual time.
+"""
+
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+
+class Clock(ABC):
+    """Base clock: current time in seconds plus delayed and idle callbacks."""
+    # Errors that mean the UI behind the clock was closed
+    closed_errors = ()
+
+    @abstractmethod
+    def now(self):
+        """Return the current monotonic time in seconds."""
+
+    @abstractmethod
+    def call_later(self, delay, callback):
+        """Run callback after delay seconds and return a handle that can be cancelled."""
+
+    @abstractmethod
+    def cancel(self, handle):
+        """Cancel a callback scheduled with call_later."""
+
+    def call_idle(self, callback):
+        """Run callback once the current burst of work is done."""
+        return self.call_later(0, callback)
+
+class TkClock(Clock):
+    """Clock backed by a Tk widget's event loop."""
+    def __init__(self, widget):
+        """Initialize the clock with the widget whose after() queue is used."""
+        import tkinter as tk
+        self.widget = widget
+        self.closed_errors = (tk.TclError,)
+
+    def now(self):
+        """Return the current monotonic time in seconds."""
+        return time.monotonic()
+
+    def call_later(self, delay, callback):
+        """Schedule callback on the Tk event loop after delay seconds."""
+        return self.widget.after(int(delay * 1000), callback)
+
+    def cancel(self, handle):
+        """Cancel a callback scheduled with call_later."""
+        self.widget.after_cancel(handle)
+
+    def call_idle(self, callback):
+        """Schedule callback for when the Tk event loop is idle."""
+        return self.widget.after_idle(callback)
+
+class VirtualClock(Clock):
+    """
+    Clock whose time only moves when advance() is called.
+    Callbacks run in deadline order, so thousands of ticks can be simulated per second.
+    """
+    def __init__(self, start=0.0):
+        """Initialize the clock at the given virtual time in seconds."""
+        self._now = start
+        self._queue = []
+        self._live = set() # Handles scheduled and not yet run or cancelled
+        self._ids = itertools.count(1) # Handles are never falsy, like Tk after() ids
+
+    def now(self):
+        """Return the current virtual time in seconds."""
+        return self._now
+
+    def call_later(self, delay, callback):
+        """Schedule callback delay virtual seconds from now."""
+        handle = next(self._ids)
+        self._live.add(handle)
+        heapq.heappush(self._queue, (self._now + max(0, delay), handle, callback))
+        return handle
+
+    def cancel(self, handle):
+        """Cancel a callback scheduled with call_later. Cancelling one that already ran does nothing."""
+        self._live.discard(handle)
+
+    def pending(self):
+        """Return the number of scheduled callbacks that have not run or been cancelled."""
+        return sum(1 for _, handle, _ in self._queue if handle in self._live)
+
+    def advance(self, seconds):
+        """Move time forward, running every callback that falls due on the way."""
+        target = self._now + seconds
+        while self._queue and self._queue[0][0] <= target:
+            deadline, handle, callback = heapq.heappop(self._queue)
+            if handle not in self._live:
+                continue # Cancelled
+            self._live.discard(handle)
+            self._now = deadline
+            callback()
+        self._now = target
+
+    def run_pending(self):
+        """Run the callbacks that are already due without moving time."""
+        self.advance(0)
+
+class AsyncioClock(Clock):
+    """Clock backed by an asyncio event loop, so the game rules run in a headless service."""
+    def __init__(self, loop):
+        """Initialize the clock with the event loop whose timers are used."""
+        self.loop = loop
+
+    def now(self):
+        """Return the event loop's monotonic time in seconds."""
+        return self.loop.time()
+
+    def call_later(self, delay, callback):
+        """Schedule callback on the event loop after delay seconds."""
+        return self.loop.call_later(max(0, delay), callback)
+
+    def cancel(self, handle):
+        """Cancel a callback scheduled with call_later."""
+        handle.cancel()
+
+    def call_idle(self, callback):
+        """Run callback on the next turn of the event loop."""
+        return self.loop.call_soon(callback)
@@ -1,72 +1,151 @@
 from Model import Model
-import random
+from Clock import TkClock
+import Trace
 import time
-import tkinter as tk
+from collections import deque
 
-#Random value ranges for different actions
-MIN = 3  # Minimum value for interactions (slightly better than base decrease)
-MAX = 5  # Maximum value for interactions (significantly better but not overwhelming)
+MAX_QUEUED_ACTIONS = 8  # Inputs kept while an animation plays, later ones are dropped
+
+# Weather backgrounds: the dice moves to the next one, sleeping shows the outside or inside night
+BACKGROUND_COUNT = 8
+OUTSIDE_BACKGROUNDS = (5, 6, 7)
+OUTSIDE_NIGHT_BACKGROUND = 7
+INSIDE_NIGHT_BACKGROUND = 4
+
+""" Returns the background the dice moves to from background_index (also works on NumPy arrays). """
+def next_background(background_index):
+    return (background_index + 1) % BACKGROUND_COUNT
+
+""" Returns the night background shown while sleeping on background_index. """
+def night_background(background_index):
+    return OUTSIDE_NIGHT_BACKGROUND if background_index in OUTSIDE_BACKGROUNDS else INSIDE_NIGHT_BACKGROUND
 
 class Controller: 
 
-    def __init__(self, main_window, observer):
-        self.pet = Model(observer) # Initialize the model with the observer
+    """
+        Initializes the controller. Timers run on the given clock, or on the main window's
+        Tk event loop when no clock is passed (pass a VirtualClock to run headless).
+        The optional data manager, save worker, random stream and stat rules are handed to the model (e.g. a JournalDataManager).
+        An optional session (a SessionRecorder or SessionReplayer from Replay.py) is attached before the first update.
+    """
+    def __init__(self, main_window, observer, clock=None, data_manager=None, save_worker=None, rng=None, session=None, rules=None):
+        self.pet = Model(observer, data_manager, save_worker, rng, rules) # Initialize the model with the observer
+        self.rng = self.pet.rng # Shares the pet's random stream, so a seed fixes every roll
         self.main_window = main_window # Store the main window
+        self.clock = clock if clock is not None else TkClock(main_window) # Schedules ticks and animations
+        self.session = session # Records or replays inputs and timer events
+        if session is not None:
+            self.clock = session.attach(self)
+        # Coalesce notifications so a burst of changes in one event-loop turn redraws once
+        self.pet.observer.set_scheduler(self.clock.call_idle, self.clock.closed_errors)
         self.is_animating = False # Track if the animation is playing
+        self.action_queue = deque() # [action, count] inputs waiting for the current animation to end
+        self.queued_actions = 0 # Inputs in the queue, merged ones included
         self.background_index = self.pet.get_background() # Get the background index
-        self.update_interval = 15  # Update stats every 15 seconds
+        self.update_interval = Model.UPDATE_INTERVAL  # Update stats every 15 seconds
         self.update_timer = None # Track the update timer
+        self.next_update = None # Clock time the next update is due
+        self.deferred_updates = 0 # Updates that fell due during an animation
+        self.tick_lag = 0.0 # Seconds the last update ran after its deadline
+        self.max_tick_lag = 0.0 # Largest tick lag seen so far
         # Start the update timer
         self.handle_update()
 
     """ Cancels the update timer if it exists. """
     def _cancel_update_timer(self):
-        if self.update_timer:
-            self.main_window.after_cancel(self.update_timer)
+        if self.update_timer is not None:
+            self.clock.cancel(self.update_timer)
             self.update_timer = None
 
-    """ Call this function to save the game state. """
-    def save_game(self):
-        self.pet.save_game_state()
+    """ Call this function to save the game state, naming the event that caused the save. """
+    def save_game(self, event="save"):
+        self.pet.save_game_state(event)
 
     """ Call this function to load the game state. """
     def load_game(self):
         self.pet.load_game_state()
 
+    """ Records an input for the attached session, if any. """
+    def record(self, event, *args):
+        if self.session is not None:
+            self.session.record(event, *args)
+
     """ Call this function to reset the game. """
     def reset_game(self):
+        self.record("reset")
         # Cancel any existing timer
         self._cancel_update_timer()
-        self.pet.reset_game()
-        #Reset the animation state
-        self.is_animating = False
-        # Restart the update cycle
-        self.handle_update()
+        with self.pet.batch():
+            self.pet.reset_game()
+            #Reset the animation state
+            self.is_animating = False
+            self.deferred_updates = 0
+            self.clear_action_queue()
+            # Restart the update cycle
+            self.next_update = None
+            self.handle_update()
 
     """
         Handles the stats update and schedules the next update.
-        Uses absolute time to prevent drift and ensures clean timer management.
+        Updates are due at fixed deadlines (start + n * interval) on the clock, so the cadence never
+        drifts. Updates that fall due during an animation are deferred and applied when it ends.
     """
     def handle_update(self):
         # Cancel any existing timer to prevent multiple timers
         self._cancel_update_timer()
+        now = self.clock.now()
+        if self.next_update is None:
+            self.next_update = now
 
-        # Only proceed if pet is running, alive, and not animating
-        if self.pet.is_running and self.pet.is_alive and not self.is_animating:
+        # Record how late the timer fired
+        if now >= self.next_update:
+            self.tick_lag = now - self.next_update
+            self.max_tick_lag = max(self.max_tick_lag, self.tick_lag)
+            if Trace.is_enabled():
+                Trace.record("controller.tick_lag", self.tick_lag)
+
+        # Run (or defer) every update that is due
+        while self.next_update <= now:
+            if self.is_animating:
+                self.deferred_updates += 1
+            else:
+                self.run_update()
+            self.next_update += self.update_interval
+
+        # Schedule next update at the next deadline
+        self.update_timer = self.clock.call_later(self.next_update - now, self.handle_update)
+
+    """ Updates the stats once and starts the poop animation if needed. """
+    def run_update(self):
+        # Only proceed if pet is running and alive
+        if self.pet.is_running and self.pet.is_alive:
             print("Stats updated!")
-            self.pet.update_stats()
+            with self.pet.batch():
+                self.pet.update_stats()
+
+                #Check if pet needs to poop 
+                if self.pet.should_trigger_poop_animation():
+                    self.make_poop()
 
-            #Check if pet needs to poop 
-            if self.pet.should_trigger_poop_animation():
-                self.make_poop()
+    """ Applies the updates deferred while an animation was playing. """
+    def apply_deferred_updates(self):
+        # A deferred update can start the poop animation, the rest wait for it to finish
+        while self.deferred_updates > 0 and not self.is_animating:
+            self.deferred_updates -= 1
+            self.run_update()
 
-        # Schedule next update using absolute time to prevent drift
-        self.update_timer = self.main_window.after(self.update_interval * 1000, self.handle_update)
+    """ Returns tick scheduling metrics in seconds. """
+    def get_tick_metrics(self):
+        return {
+            "tick_lag": self.tick_lag,
+            "max_tick_lag": self.max_tick_lag,
+            "deferred_updates": self.deferred_updates
+        }
 
     """ Stops the update cycle and clean up timers. """
     def stop(self):
         self._cancel_update_timer()
-        self.pet.stop()
+        self.pet.stop() # Also writes any save still queued
 
     """
         Plays an animation for a specified duration then returns to idle.
@@ -81,114 +160,169 @@ class Controller:
             self.pet.set_action(action, secondary_action)
             
             # Schedule return to idle
-            self.main_window.after(int(duration * 1000), self.return_to_idle)
+            self.clock.call_later(duration, self.return_to_idle)
             return True
         return False
 
     """ Returns the pets to it's idle state after being interacted with. """ 
     def return_to_idle(self):
-        self.pet.set_action(self.pet.get_action_mood())
-        self.pet.set_background(self.background_index)
+        with self.pet.batch():
+            self.pet.set_action(self.pet.get_action_mood())
+            self.pet.set_background(self.background_index)
 
-        #Set to false to allow animations again
-        self.is_animating = False
-        self.save_game()
+            #Set to false to allow animations again
+            self.is_animating = False
+            self.save_game("idle")
 
-        # Force an update check since animation might have delayed it
-        self.handle_update()
+            # Catch up on updates that fell due during the animation, then on queued inputs
+            self.apply_deferred_updates()
+            self.process_action_queue()
 
     """
-        Feed action button, increases weight and health and decreases poop level.
-        Randomly selects to eat oniguri or dessert.
-        Increment and decrement of stats is random (1-3).
+        Runs an action (feed, dance, sleep, dice or poop) right away when the pet is idle, otherwise
+        queues it until the current animation ends. Returns False if the input was dropped because
+        the queue is full (poop is never dropped).
     """
+    def request_action(self, name):
+        if not self.is_animating and not self.pet.is_updating and not self.action_queue:
+            self.run_actions(name, 1)
+            return True
+        if name == "poop":
+            # The pet poops right after the current animation, and only once however often it's triggered
+            if not any(queued == "poop" for queued, count in self.action_queue):
+                self.action_queue.appendleft(["poop", 1])
+                self.queued_actions += 1
+            return True
+        if self.queued_actions >= MAX_QUEUED_ACTIONS:
+            return False
+        # Repeated requests for the same action are merged into one animation
+        if self.action_queue and self.action_queue[-1][0] == name:
+            self.action_queue[-1][1] += 1
+        else:
+            self.action_queue.append([name, 1])
+        self.queued_actions += 1
+        return True
+
+    """ Applies the stat effects of count requests for an action in order, then plays its animation once. """
+    def run_actions(self, name, count=1):
+        with self.pet.batch():
+            for _ in range(count):
+                animation = getattr(self, "_apply_" + name)()
+            self.play_animation_sequence(*animation)
+            self.save_game(name)
+
+    """ Starts the next queued action once the pet is idle. Queued inputs are dropped if the pet has died. """
+    def process_action_queue(self):
+        if not self.pet.is_alive:
+            self.clear_action_queue()
+        elif self.action_queue and not self.is_animating and not self.pet.is_updating:
+            name, count = self.action_queue.popleft()
+            self.queued_actions -= count
+            self.run_actions(name, count)
+
+    """ Forgets every queued input. """
+    def clear_action_queue(self):
+        self.action_queue.clear()
+        self.queued_actions = 0
+
+    """ Feed action button, runs or queues a feed. """
     def feed(self):
-        if not self.is_animating and not self.pet.is_updating:
-            increase = random.randint(MIN, MAX)
-            self.pet.set_weight(self.pet.get_weight() + increase)
-            self.pet.set_health(self.pet.get_health() + increase)
-            self.pet.set_poop_level(self.pet.get_poop_level() + increase)
-            choice = random.choice(["oniguri", "dessert"])
-            self.play_animation_sequence("eat", 3, choice)
-    
-    """
-        Dance action button, increases health and decreases poop level.
-        Randomly selects to dance in left or right direction.
-        Increment and decrement of stats is random (1-3).
-    """
+        self.record("feed")
+        return self.request_action("feed")
+
+    """ Dance action button, runs or queues a dance. """
     def dance(self):
-        if not self.is_animating and not self.pet.is_updating:
-            increase = random.randint(MIN, MAX)
+        self.record("dance")
+        return self.request_action("dance")
 
-            self.pet.set_health(self.pet.get_health() + increase)
-            self.pet.set_poop_level(self.pet.get_poop_level() - increase)
-            choice = random.choice(["dance", "dance_reverse"])
-            self.play_animation_sequence(choice, 3)
+    """ Sleep action button, runs or queues a nap. """
+    def sleep(self):
+        self.record("sleep")
+        return self.request_action("sleep")
+
+    """ Dice roll action button, runs or queues a dice roll. """
+    def random_event(self):
+        self.record("dice")
+        return self.request_action("dice")
+
+    """ Starts (or queues) the poop animation, called when the pet needs to poop. """
+    def make_poop(self):
+        return self.request_action("poop")
+
+    """
+        Feed effects, increases weight and health and decreases poop level.
+        Randomly selects to eat oniguri or dessert.
+        Increment and decrement of stats is random, as set by the "feed" rule.
+    """
+    def _apply_feed(self):
+        self.pet.apply_rule("feed")
+        choice = self.rng.choice(["oniguri", "dessert"])
+        return ("eat", 3, choice)
+
+    """
+        Dance effects, increases health and decreases poop level.
+        Randomly selects to dance in left or right direction.
+        Increment and decrement of stats is random, as set by the "dance" rule.
+    """
+    def _apply_dance(self):
+        self.pet.apply_rule("dance")
+        choice = self.rng.choice(["dance", "dance_reverse"])
+        return (choice, 3)
 
     """
-        Sleep action button, decreases weight and increases health and poop level.
+        Sleep effects, decreases weight and increases health and poop level.
         Changes background to night-time background during sleep animation, 
-        based on pet's current background. Increment and decrement of stats is random (1-3).
+        based on pet's current background. Increment and decrement of stats is random, as set by the "sleep" rule.
     """
-    def sleep(self):
-        if not self.is_animating and not self.pet.is_updating:
-            increase = random.randint(MIN, MAX)
-            self.pet.set_weight(self.pet.get_weight() - increase)
-            self.pet.set_health(self.pet.get_health() + increase)
-            self.pet.set_poop_level(self.pet.get_poop_level() + increase)
-            #Determine's pet's current background and sets the night bg accordingly
-            if(self.background_index in [5, 6, 7]):
-                self.pet.set_background(7) #outside night bg index
-            else:
-                self.pet.set_background(4) #inside night bg index
-            self.play_animation_sequence("sleep", 3)
+    def _apply_sleep(self):
+        self.pet.apply_rule("sleep")
+        #Determine's pet's current background and sets the night bg accordingly
+        self.pet.set_background(night_background(self.background_index))
+        return ("sleep", 3)
 
     """
-        Dice roll action button, selects a random animation reaction (postive or negative)
+        Dice roll effects, selects a random animation reaction (postive or negative)
         with an asscosiated stat effect and a background change. Purpose is to stimulate
-        a pet's reaction to a scenary change. 
+        a pet's reaction to a scenary change. The "dice" rule's outcomes name the reactions.
     """
-    def random_event(self):
-        if not self.is_animating and not self.pet.is_updating:
-            #Dice roll possible outcomes
-            roll = {"fustrated":-MAX, "attention":-MIN, "look":MIN, "dance_reverse":MAX}
-            #Change background to the next background index
-            new_background = self.background_index + 1
-            if(new_background > 7):
-                new_background = 0 #reset to first background index
-            self.background_index = new_background
-            self.pet.set_background(new_background)
-
-            #Rolls dice and applies stat effect and duration
-            result = random.choice(list(roll.items()))
-            self.pet.set_health(self.pet.get_health() + result[1])
-            duration = 5 if result[0] == "fustrated" else 3
-            self.play_animation_sequence(result[0], duration)
-
-    """
-        Plays the poop animation and sets the poop visible to true, until cleaned.
+    def _apply_dice(self):
+        #Change background to the next background index
+        new_background = next_background(self.background_index)
+        self.background_index = new_background
+        self.pet.set_background(new_background)
+
+        #Rolls dice and applies stat effect and duration
+        reaction = self.pet.apply_rule("dice")
+        duration = 5 if reaction == "fustrated" else 3
+        return (reaction, duration)
+
+    """
+        Poop effects, sets the poop visible to true, until cleaned.
         Restores the poop level to 0, for next poop event.
     """
-    def make_poop(self):
-        if not self.is_animating and not self.pet.is_updating:
-            print("Poop animation intiated.")
-            self.play_animation_sequence("pooping", 2, "poop")
-            self.pet.set_poop_visible(True)
-            self.pet.set_poop_level(0)
-            self.save_game()
-        else:
-            if self.pet.is_updating:
-                self.main_window.after(100, self.make_poop)
+    def _apply_poop(self):
+        print("Poop animation intiated.")
+        self.pet.apply_rule("poop")
+        return ("pooping", 2, "poop")
 
     """ Cleans up poop by resting poop stats to 0, for the next poop event. """
     def clean_poop(self):
-        if self.pet.get_poop_visible():
-            print("Poop cleaned.")
-            self.pet.set_poop_visible(False)
-            self.save_game()
-            return True
+        self.record("clean")
+        with self.pet.batch():
+            if self.pet.apply_rule("clean"):
+                print("Poop cleaned.")
+                self.save_game("clean")
+                return True
         return False
 
+    """
+        Returns the (action, background) scenes the pet is likely to show next:
+        idle on the next background after a dice roll, and sleeping on the night background.
+    """
+    def predict_next_scenes(self):
+        return [(self.pet.get_action_mood(), next_background(self.background_index)),
+                ("sleep", night_background(self.background_index))]
+
     """ Returns a dictionary of the pet's stats. """
     def get_pet(self):
         return self.pet.get_pet()
@@ -199,4 +333,6 @@ class Controller:
 
     """ Sets the name of the pet. """
     def set_name(self, name: str):
-        self.pet.set_name(name)
\ No newline at end of file
+        self.record("rename", name)
+        self.pet.set_name(name)
+        self.save_game("rename")
\ No newline at end of file
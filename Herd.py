@@ -0,0 +1,234 @@
+"""
+Herd Simulation System for Tamagotchi Game
+Stores many pets as NumPy columns and applies the game's stat rules to all of them at once.
+"""
+
+import numpy as np
+from Controller import next_background
+from Model import Model
+from Rules import MOODS, get_rules
+
+# Idle action for each mood, indexed by mood constant
+MOOD_ACTIONS = list(MOODS)
+
+# Columnar stats and their array types
+COLUMNS = {
+    "age": np.int32,
+    "weight": np.int32,
+    "health": np.int32,
+    "poop_level": np.int32,
+    "poop_visible": np.bool_,
+    "is_alive": np.bool_,
+    "mood": np.int8,
+    "background": np.int8
+}
+
+class Herd:
+    """Columnar store of pet stats with a vectorized update_stats."""
+    def __init__(self, capacity=1024, seed=None, rules=None):
+        """Initialize an empty herd following the given RuleSet (the built-in rules by default). Columns grow automatically past the capacity."""
+        self.size = 0
+        self.names = []
+        self.rng = np.random.default_rng(seed)
+        self.rules = rules if rules is not None else get_rules()
+        self._columns = {name: np.zeros(max(1, capacity), dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    @classmethod
+    def from_states(cls, states, seed=None, rules=None):
+        """Create a herd from a list of stat dictionaries (as returned by Model.get_pet)."""
+        herd = cls(capacity=len(states), seed=seed, rules=rules)
+        for state in states:
+            herd.add(state)
+        return herd
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        """Expose each column, trimmed to the number of pets, as an attribute (e.g. herd.health)."""
+        columns = self.__dict__.get("_columns")
+        if columns is not None and name in columns:
+            return columns[name][:self.size]
+        raise AttributeError(name)
+
+    def _grow(self, capacity):
+        """Resize every column to hold at least capacity pets."""
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+
+    def add(self, state):
+        """Append a pet from a stat dictionary and return its row index."""
+        if self.size == len(self._columns["age"]):
+            self._grow(self.size * 2)
+        index = self.size
+        self.size += 1
+        self.names.append(state.get("name", "Sekitoritchi"))
+        for name in COLUMNS:
+            self._columns[name][index] = state.get(name, 0)
+        return index
+
+    def row(self, index):
+        """Return a HerdPet giving the single-pet Model API over one row."""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return HerdPet(self, index)
+
+    def get_pet(self, index):
+        """Return a dictionary of one pet's stats, matching Model.get_pet."""
+        stats = {"name": self.names[index]}
+        for name in ("age", "weight", "mood", "health", "poop_level", "is_alive", "poop_visible"):
+            stats[name] = self._columns[name][index].item()
+        stats["action"] = MOOD_ACTIONS[stats["mood"]]
+        stats["background"] = self._columns["background"][index].item()
+        return stats
+
+    def _rows(self, rows):
+        """Return the given rows (a slice, mask or index array) as an index array."""
+        return np.arange(self.size)[rows]
+
+    def set_mood(self, rows=slice(None)):
+        """Band every pet's mood from its health (dead pets get MOOD_DEAD)."""
+        self.rules.apply_batch("mood", self, self._rows(rows))
+
+    def update_stats(self, rows=slice(None)):
+        """
+        Apply one tick to every living pet, or to the given rows, in a single vectorized pass.
+        Follows Model.update_stats followed by the controller's poop trigger, like Model.catch_up.
+        """
+        rows = self._rows(rows)
+        living = rows[self.is_alive[rows]]
+        self.rules.apply_batch("tick", self, living)
+        # Poop appears (and hurts) once the level is high enough, then the level restarts
+        pooping = self.rules.apply_batch("poop_check", self, living)
+        self.rules.apply_batch("poop", self, living[pooping])
+        self.set_mood(rows)
+
+    def feed(self, rows=slice(None)):
+        """Feed the given pets, as Controller.feed does."""
+        self.rules.apply_batch("feed", self, self._rows(rows))
+
+    def dance(self, rows=slice(None)):
+        """Dance the given pets, as Controller.dance does."""
+        self.rules.apply_batch("dance", self, self._rows(rows))
+
+    def sleep(self, rows=slice(None)):
+        """
+        Put the given pets to sleep, as Controller.sleep does.
+        The night background only lasts for the animation, so the background is left as is.
+        """
+        self.rules.apply_batch("sleep", self, self._rows(rows))
+
+    def random_event(self, rows=slice(None)):
+        """Roll the dice for the given pets, as Controller.random_event does: next background and a reaction."""
+        rows = self._rows(rows)
+        self.background[rows] = next_background(self.background[rows])
+        return self.rules.apply_batch("dice", self, rows)
+
+    def clean_poop(self, rows=slice(None)):
+        """Clean up the given pets' poop."""
+        self.rules.apply_batch("clean", self, self._rows(rows))
+
+class HerdPet:
+    """Single-pet Model API backed by one row of a Herd."""
+    MOOD_HAPPY = Model.MOOD_HAPPY
+    MOOD_MIDDLE = Model.MOOD_MIDDLE
+    MOOD_ANGRY = Model.MOOD_ANGRY
+    MOOD_SAD = Model.MOOD_SAD
+    MOOD_DEAD = Model.MOOD_DEAD
+
+    def __init__(self, herd, index):
+        """Initialize the view onto a herd row."""
+        self.herd = herd
+        self.index = index
+
+    def _get(self, column):
+        """Read one column value for this row."""
+        return getattr(self.herd, column)[self.index].item()
+
+    def _set(self, column, value):
+        """Write one column value for this row."""
+        getattr(self.herd, column)[self.index] = value
+
+    def get_pet(self):
+        """Return a dictionary of the pet's stats."""
+        return self.herd.get_pet(self.index)
+
+    def get_action_mood(self):
+        """Return the pet's idle action based on mood."""
+        mood = self._get("mood")
+        return MOOD_ACTIONS[mood] if mood != Model.MOOD_DEAD else "sad"
+
+    def get_is_alive(self):
+        """Return whether the pet is alive."""
+        return self._get("is_alive")
+
+    def get_poop_visible(self):
+        """Return if poop is visible."""
+        return self._get("poop_visible")
+
+    def get_background(self):
+        """Return the pet's background."""
+        return self._get("background")
+
+    def get_weight(self):
+        """Return the pet's weight."""
+        return self._get("weight")
+
+    def get_health(self):
+        """Return the pet's health."""
+        return self._get("health")
+
+    def get_poop_level(self):
+        """Return the pet's poop level."""
+        return self._get("poop_level")
+
+    def get_age(self):
+        """Return the pet's age."""
+        return self._get("age")
+
+    def set_name(self, name):
+        """Set the pet's name."""
+        self.herd.names[self.index] = name
+
+    def set_age(self, age):
+        """Set the pet's age."""
+        self._set("age", age)
+
+    def set_health(self, health):
+        """Set the pet's health."""
+        # Clamp health between 0 and 100
+        self._set("health", max(0, min(100, health)))
+
+    def set_is_alive(self, alive):
+        """Set whether the pet is alive."""
+        self._set("is_alive", alive)
+
+    def set_background(self, background):
+        """Set the pet's background."""
+        self._set("background", background)
+
+    def set_weight(self, weight):
+        """Set the pet's weight."""
+        self._set("weight", weight)
+
+    def set_poop_level(self, poop_level):
+        """Set the pet's poop level."""
+        self._set("poop_level", poop_level)
+
+    def set_poop_visible(self, visible):
+        """Set whether the pet's poop is visible."""
+        self._set("poop_visible", visible)
+
+    def set_mood(self):
+        """Set the pet's mood based on health level."""
+        self.herd.set_mood(slice(self.index, self.index + 1))
+
+    def should_trigger_poop_animation(self):
+        """Check if the poop animation should be triggered, as Model does."""
+        return bool(self.herd.rules.apply_batch("poop_check", self.herd, np.array([self.index]))[0])
+
+    def update_stats(self):
+        """Apply one tick to this pet only."""
+        self.herd.update_stats(slice(self.index, self.index + 1))
@@ -1,7 +1,12 @@
 import json
 import os
-import tkinter as tk
+import queue
 import random
+import threading
+import time
+from contextlib import contextmanager
+from Trace import traced
+from Rules import MOODS, get_rules
 
 class Model:
     """ Mood constants. """
@@ -11,19 +16,34 @@ class Model:
     MOOD_SAD = 3
     MOOD_DEAD = 4
 
-    """ Initializes the model. """
-    def __init__(self, observer):
-        self.data_manager = DataManager()
+    """ Seconds between stat updates. """
+    UPDATE_INTERVAL = 15
+
+    """
+        Initializes the model. Saves go to the given data manager, or the JSON save file by default,
+        through the given save worker (shared by many pets in a service) or a worker of its own.
+        Random stat changes are drawn from rng, the pet's own random.Random stream (seed it to make runs repeatable).
+        Stat changes follow the given compiled RuleSet, or the built-in rule table by default.
+    """
+    def __init__(self, observer, data_manager=None, save_worker=None, rng=None, rules=None):
+        self.rng = rng if rng is not None else random.Random() # Set before loading, catching up draws from it
+        self.rules = rules if rules is not None else get_rules()
+        self.data_manager = data_manager if data_manager is not None else DataManager()
+        self.owns_save_worker = save_worker is None # A shared worker is stopped by whoever created it
+        self.save_worker = save_worker if save_worker is not None else SaveWorker(self.data_manager) # Writes saves off the UI thread
         self.observer = Observer()  # Create observer instance
         self.observer.add_observer(observer) # Add passed in observer
         self.load_game_state() # Load game state, if none use default values
         self.is_running = True # Track if the model is running
         self.is_updating = False # Track if the model is updating
         self.secondary_action = None  # Initialize secondary_action
-        self.poop_visible = False  # Track if poop is currently visible
 
-    """ Loads the game state from saved data. """
+    """
+        Loads the game state from saved data. Saved poop stays visible (and keeps hurting) until
+        cleaned, however long the game was closed.
+    """
     def load_game_state(self):
+        self.flush_saves() # Read back what was last saved, not an older file
         data = self.data_manager.load_data()
         self.name = data["name"]
         self.age = data["age"]
@@ -34,22 +54,62 @@ class Model:
         self.action = self.get_action_mood()
         self.background = data["background"]
         self.poop_level = data["poop_level"]
-        self.poop_visible = False  # Reset poop visibility on load
+        self.poop_visible = data.get("poop_visible", False)
+
+        # Apply the updates missed while the game was closed
+        if "last_updated" in data:
+            missed_ticks = int((time.time() - data["last_updated"]) // self.UPDATE_INTERVAL)
+            if missed_ticks > 0:
+                self.catch_up(missed_ticks)
+                self.save_game_state("catch_up")
+
+    """
+        Applies a number of missed stat updates in one pass, without saving or notifying per tick.
+        Follows update_stats plus the controller's poop trigger, and stops as soon as the pet dies.
+    """
+    def catch_up(self, ticks: int):
+        for _ in range(ticks):
+            if not self.is_alive:
+                break
+            self._apply_tick()
+            # Poop appears (and hurts) once the level is high enough, then the level restarts
+            if self.rules.apply("poop_check", self):
+                self.rules.apply("poop", self)
+        self.set_mood()
 
-    """ Saves the current game state. """
-    def save_game_state(self):
+    """
+        Queues the current game state to be saved by the background save worker.
+        The event names what caused the save (tick, feed, clean, ...) for journaling data managers.
+    """
+    def save_game_state(self, event="save"):
         data = self.get_pet()
-        return self.data_manager.save_data(data)
+        return self.save_worker.submit(data, event, self.data_manager)
+
+    """ Blocks until every queued save of this pet has been written. """
+    def flush_saves(self):
+        self.save_worker.flush(self.data_manager)
     
     """ Resets the game state (with default values) and loads new game state (default values). """
     def reset_game(self):
-        self.data_manager.reset_data()
-        self.load_game_state()
+        with self.batch():
+            before = self.get_state()
+            # Make sure no queued save overwrites the reset
+            self.flush_saves()
+            self.data_manager.reset_data()
+            self.load_game_state()
+            self.secondary_action = None
+            self.notify_changes(before)
+
+    """ Groups several changes into a single observer notification. """
+    def batch(self):
+        return self.observer.batch()
 
     """ Stops the model and cleanup. """
     def stop(self):
         self.is_running = False
         self.observer.stop()
+        if self.owns_save_worker:
+            self.save_worker.stop()
 
     """ Cleans up the model when it is destroyed. """
     def __del__(self):
@@ -98,26 +158,49 @@ class Model:
         
         return stats
 
+    """ Returns the pet's stats plus the secondary action, used to diff changes for observers. """
+    def get_state(self):
+        state = self.get_pet()
+        state["secondary_action"] = self.secondary_action
+        return state
+
+    """ Notifies observers of every field that differs from a previous get_state() snapshot. """
+    def notify_changes(self, before):
+        after = self.get_state()
+        changes = {}
+        for field, old in before.items():
+            if after[field] != old:
+                changes[field] = (old, after[field])
+        if changes:
+            self.observer.notify_observers(changes)
+
+    """ Sets fields and notifies observers with the old and new value of those that changed. """
+    def _set_fields(self, **fields):
+        changes = {}
+        for field, value in fields.items():
+            old = getattr(self, field)
+            setattr(self, field, value)
+            if old != value:
+                changes[field] = (old, value)
+        if changes:
+            self.observer.notify_observers(changes)
+
     """ Sets the pet's name. """
     def set_name(self, name: str):
-        self.name = name
-        self.observer.notify_observers()
+        self._set_fields(name=name)
 
     """ Sets the pet's age. """
     def set_age(self, age: int):
-        self.age = age
-        self.observer.notify_observers()
+        self._set_fields(age=age)
 
     """ Sets the pet's health. """
     def set_health(self, health: int):
         # Clamp health between 0 and 100
-        self.health = max(0, min(100, health))  
-        self.observer.notify_observers()
+        self._set_fields(health=max(0, min(100, health)))
 
     """ Sets whether the pet is alive. """
     def set_is_alive(self, alive: bool):
-        self.is_alive = alive
-        self.observer.notify_observers()
+        self._set_fields(is_alive=alive)
 
     """ Sets the pet's poop level. """
     def set_poop(self, poop: int):
@@ -126,100 +209,70 @@ class Model:
 
     """ Sets the pet's action. """
     def set_action(self, action, secondary_action=None):
-        self.action = action
-        self.secondary_action = secondary_action
-        self.observer.notify_observers()
+        self._set_fields(action=action, secondary_action=secondary_action)
 
     """ Sets the pet's background. """
     def set_background(self, background: int):
-        self.background = background
-        self.observer.notify_observers()
+        self._set_fields(background=background)
 
     """ Sets the pet's weight. """
     def set_weight(self, weight: int):
-        self.weight = weight
-        self.observer.notify_observers()
+        self._set_fields(weight=weight)
 
     """ Sets the pet's poop level. """
     def set_poop_level(self, poop_level: int):
-        self.poop_level = poop_level
-        self.observer.notify_observers()
+        self._set_fields(poop_level=poop_level)
 
     """ Sets whether the pet's poop is visible. """
     def set_poop_visible(self, visible: bool):
-        self.poop_visible = visible
-        self.observer.notify_observers()
+        self._set_fields(poop_visible=visible)
+
+    """
+        Applies a rule from the rule table (an action such as feed, or the tick) to the stats
+        and notifies observers of the fields it changed. Returns the rule's result.
+    """
+    def apply_rule(self, name):
+        before = self.get_state()
+        result = self.rules.apply(name, self)
+        self.notify_changes(before)
+        return result
 
     """ Checks if the poop animation should be triggered. """
     def should_trigger_poop_animation(self):
-        if self.poop_level >= 75:
-            self.poop_visible = True  # Set poop as visible
-            # Poop affects health negatively
-            self.health = max(0, self.health - 3)
-            return True
-        return False
+        # Set poop as visible, poop affects health negatively
+        return self.apply_rule("poop_check")
 
     """ Sets the pet's mood based on health level. """
     def set_mood(self):
-        if not self.is_alive:
-            self.mood = self.MOOD_DEAD
-            self.action = "dead"
-        elif 75 <= self.health <= 100:
-            self.mood = self.MOOD_HAPPY
-            self.action = "happy"
-        elif 50 <= self.health < 75:
-            self.mood = self.MOOD_MIDDLE
-            self.action = "middle"
-        elif 25 <= self.health < 50:
-            self.mood = self.MOOD_ANGRY
-            self.action = "angry"
-        else:
-            self.mood = self.MOOD_SAD
-            self.action = "sad"
+        self.rules.apply("mood", self)
+        self.action = MOODS[self.mood]
 
     """ Called by controller on an interval to update stats. """
+    @traced("model.update_stats")
     def update_stats(self):
         if not self.is_running or not self.is_alive or self.is_updating:
             return
 
         self.is_updating = True  # Acquire lock
 
-        #Increament poop level and age
-        self.poop_level = min(100, self.poop_level + 5)
-        self.age += 1
-        
-        #Calc random decrease
-        base_decrease = random.randint(1, 2)
-        if self.weight > 325:
-            # Overweight pets lose health faster
-            self.health = max(0, self.health - base_decrease)
-            self.weight = max(0, self.weight - (base_decrease // 2))
-        elif self.age > 50:
-            # Older pets lose health faster
-            self.health = max(0, self.health - base_decrease)
-            self.weight = max(0, self.weight - (base_decrease // 3))
-        else:
-            #Normal decrease
-            self.health = max(0, self.health - (base_decrease // 2))
-            self.weight = max(0, self.weight - (base_decrease // 4))
+        with self.batch():
+            before = self.get_state()
 
-        # Decrease health if poop is visible
-        if self.poop_visible:
-            self.health = max(0, self.health - 3)
+            self._apply_tick()
 
-        # Check if pet is still alive
-        if self.health <= 0 or self.weight <= 0:
-            self.is_alive = False
+            # Update mood based on current state
+            self.set_mood()
 
-        # Update mood based on current state
-        self.set_mood()
-
-        #Save and notify observers
-        self.save_game_state()
-        self.observer.notify_observers()
+            #Save and notify observers
+            self.save_game_state("tick")
+            self.notify_changes(before)
         
         self.is_updating = False  # Release lock
 
+    """ Applies one tick of aging, poop and health/weight decay to the stats (no save or notify). """
+    def _apply_tick(self):
+        self.rules.apply("tick", self)
+
     """ Returns the pet's weight. """
     def get_weight(self) -> int:
         return self.weight
@@ -252,16 +305,26 @@ class DataManager:
         }
 
     """ Saves the game data to a JSON file. """
+    @traced("data_manager.save_data")
     def save_data(self, data):
+        # Record when the state was saved so missed updates can be applied on load
+        data = dict(data, last_updated=time.time())
+        temp_file = self.save_file + ".tmp"
         try:
-            with open(self.save_file, 'w') as f:
+            # Write to a temporary file and rename it, so a crash never leaves a half-written save
+            with open(temp_file, 'w') as f:
                 #Converts/saves python object to JSON string
                 json.dump(data, f, indent=4)
+            os.replace(temp_file, self.save_file)
             return True
-        except (IOError, json.JSONDecodeError) as e:
+        except (OSError, TypeError, ValueError) as e:
             print(f"Failed to save game data: {e}")
             return False
 
+    """ Saves a batch of (data, event) snapshots. Only the newest one matters for a whole-file save. """
+    def save_batch(self, snapshots):
+        return self.save_data(snapshots[-1][0])
+
     """ Loads the game data from a JSON file. """
     def load_data(self):
         try:
@@ -270,7 +333,7 @@ class DataManager:
                     #Converts/loads JSON string to python object
                     return json.load(f)
             return self.default_data
-        except (IOError, json.JSONDecodeError) as e:
+        except (OSError, ValueError) as e: # ValueError covers json.JSONDecodeError
             print(f"Failed to load game data: {e}")
             return self.default_data 
 
@@ -278,34 +341,317 @@ class DataManager:
     def reset_data(self):
         self.save_data(self.default_data)
 
+"""
+    Journaling data manager: appends one compact delta record per save event to a journal file
+    and periodically compacts the journal into the JSON snapshot. Loading reads the snapshot and
+    replays the journal after it, truncating a corrupt tail instead of falling back to defaults.
+"""
+class JournalDataManager(DataManager):
+
+    """ Initializes the journal. The snapshot is compacted every compact_every records. """
+    def __init__(self, compact_every=200):
+        super().__init__()
+        self.journal_file = "save_file.journal"
+        self.compact_every = compact_every
+        self.seq = 0 # Sequence number of the last journal record
+        self.records = 0 # Records written since the last compaction
+        self._state = None # Last state written, used to compute deltas
+
+    """ Saves a single snapshot as one journal record. """
+    def save_data(self, data, event="save"):
+        return self.save_batch([(data, event)])
+
+    """ Appends a delta record for every snapshot, compacting once enough records have built up. """
+    def save_batch(self, snapshots):
+        lines = []
+        for data, event in snapshots:
+            delta = {}
+            for field, value in data.items():
+                if self._state is None or self._state.get(field) != value:
+                    delta[field] = value
+            self.seq += 1
+            record = {"seq": self.seq, "t": time.time(), "e": event, "d": delta}
+            lines.append(json.dumps(record, separators=(',', ':')) + "\n")
+            self._state = dict(data)
+        try:
+            with open(self.journal_file, 'a') as f:
+                f.write("".join(lines))
+                f.flush()
+        except IOError as e:
+            print(f"Failed to append to game journal: {e}")
+            return False
+        self.records += len(lines)
+        if self.records >= self.compact_every:
+            self.compact()
+        return True
+
+    """ Writes the current state as the snapshot and empties the journal. """
+    def compact(self):
+        if self._state is None:
+            return True
+        # The snapshot remembers the last record it includes, so a crash before truncating is harmless
+        if not super().save_data(dict(self._state, journal_seq=self.seq)):
+            return False
+        try:
+            open(self.journal_file, 'w').close()
+        except IOError as e:
+            print(f"Failed to truncate game journal: {e}")
+            return False
+        self.records = 0
+        return True
+
+    """ Loads the snapshot and replays the journal records written after it. """
+    def load_data(self):
+        data = dict(super().load_data())
+        snapshot_seq = data.pop("journal_seq", 0)
+        self.seq = snapshot_seq
+        self.records = 0
+        if os.path.exists(self.journal_file):
+            try:
+                with open(self.journal_file, 'rb') as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            seq, delta, timestamp = record["seq"], record["d"], record["t"]
+                        except (ValueError, KeyError, TypeError):
+                            # Corrupt or half-written tail, drop it and everything after it
+                            print(f"Truncating corrupt game journal at byte {offset}")
+                            f.close()
+                            os.truncate(self.journal_file, offset)
+                            break
+                        offset += len(line)
+                        self.records += 1
+                        if seq > snapshot_seq:
+                            data.update(delta)
+                            data["last_updated"] = timestamp
+                            self.seq = seq
+            except IOError as e:
+                print(f"Failed to read game journal: {e}")
+        self._state = None # Next record holds the full state
+        return data
+
+    """ Resets the game data, starting a fresh snapshot and an empty journal. """
+    def reset_data(self):
+        self._state = dict(self.default_data)
+        self.compact()
+
+""" Writes saves on a background thread, merging saves that arrive within a short window. """
+class SaveWorker:
+
+    """
+        Initializes and starts the worker. Saves arriving within window seconds are merged into one write
+        per data manager. Saves go to the given data manager unless submitted with their own.
+    """
+    def __init__(self, data_manager=None, window=0.5):
+        self.data_manager = data_manager
+        self.window = window
+        self.is_running = True
+        self._queue = queue.Queue()
+        self._pending = {} # Data manager -> saves queued and not yet written
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="SaveWorker", daemon=True)
+        self._thread.start()
+
+    """ Queues a snapshot of the game data, and the event that caused it, to be saved. """
+    def submit(self, data, event="save", data_manager=None):
+        data_manager = data_manager if data_manager is not None else self.data_manager
+        if not self.is_running:
+            # Saves after stopping are written straight away
+            return data_manager.save_batch([(dict(data), event)])
+        with self._pending_lock:
+            self._pending[data_manager] = self._pending.get(data_manager, 0) + 1
+        self._queue.put((data_manager, dict(data), event))
+        return True
+
+    """
+        Blocks until everything queued so far has been written. Given a data manager, returns
+        straight away if none of its saves are waiting (a shared worker may be busy with other pets).
+    """
+    def flush(self, data_manager=None):
+        if not self.is_running:
+            return
+        if data_manager is not None:
+            with self._pending_lock:
+                if not self._pending.get(data_manager):
+                    return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    """ Writes any pending save and stops the worker thread. """
+    def stop(self):
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._queue.put(None)
+        self._thread.join()
+
+    """ Worker loop: collects saves for up to window seconds and hands them to the data manager in one batch. """
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            snapshots = {} # Data manager -> snapshots in the order they were queued
+            waiters = []
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    data_manager, data, event = item
+                    snapshots.setdefault(data_manager, []).append((data, event))
+                # Flushes and stops write immediately, otherwise wait out the window
+                timeout = 0 if (stopping or waiters) else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                for data_manager, batch in snapshots.items():
+                    try:
+                        data_manager.save_batch(batch)
+                    except Exception as e:
+                        # A failing data manager must not end the thread, flushes would wait forever
+                        print(f"Failed to save game data: {e}")
+                    finally:
+                        with self._pending_lock:
+                            remaining = self._pending.pop(data_manager, 0) - len(batch)
+                            if remaining > 0:
+                                self._pending[data_manager] = remaining
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+            if stopping:
+                return
+
 class Observer:
-    """Manages observer callbacks and notifications."""
+    """
+    Manages observer callbacks and field-level change notifications.
+    Changes are dictionaries of field name -> (old value, new value). A notification
+    without changes means everything may have changed and is sent to callbacks as None.
+    """
     def __init__(self):
-        self._observers = []
+        self._observers = [] # (callback, fields) pairs, fields is None for every field
         self.is_running = True
-
-    """Add an observer callback function"""
-    def add_observer(self, callback):
-        if callback not in self._observers:
-            self._observers.append(callback)
+        self._batch_depth = 0 # Nesting level of open batches
+        self._pending = None # Changes waiting to be sent, keyed by field
+        self._pending_all = False # Whether a full refresh is waiting to be sent
+        self._scheduler = None # Idle scheduler used to coalesce notifications, e.g. after_idle
+        self._flush_scheduled = False # Whether an idle flush is already queued
+        self._closed_errors = () # Errors meaning the UI was closed, e.g. Tk's TclError
+
+    """Add an observer callback function, optionally only for changes to specific fields"""
+    def add_observer(self, callback, fields=None):
+        if fields is not None:
+            fields = frozenset(fields)
+        for registered, _ in self._observers:
+            if registered == callback:
+                return
+        self._observers.append((callback, fields))
 
     """Remove an observer callback function"""
     def remove_observer(self, callback):
-        if callback in self._observers:
-            self._observers.remove(callback)
-
-    """Notify all observers of a change"""
-    def notify_observers(self):
+        self._observers = [(registered, fields) for registered, fields in self._observers if registered != callback]
+
+    """
+        Sets the idle scheduler (such as Tk's after_idle) used to coalesce notifications.
+        With a scheduler set, every notification in one event-loop turn results in a single callback.
+        Closed errors are the exceptions that mean the UI was destroyed and notifications should stop.
+    """
+    def set_scheduler(self, scheduler, closed_errors=()):
+        self._scheduler = scheduler
+        self._closed_errors = closed_errors
+
+    """Records changes (merged with any pending ones) and notifies observers"""
+    @traced("observer.notify")
+    def notify_observers(self, changes=None):
         if not self.is_running:
             return
-        for observer in self._observers:
+        self._merge(changes)
+        # Changes inside a batch are sent once the outermost batch commits
+        if self._batch_depth > 0:
+            return
+        if self._scheduler is None:
+            self.flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            try:
+                self._scheduler(self._idle_flush)
+            except self._closed_errors:
+                # The window was probably destroyed
+                self.is_running = False
+
+    """Merges changes into the pending ones, keeping the oldest old value and the newest new value."""
+    def _merge(self, changes):
+        if changes is None:
+            self._pending_all = True
+            return
+        if self._pending is None:
+            self._pending = {}
+        for field, (old, new) in changes.items():
+            if field in self._pending:
+                old = self._pending[field][0]
+            self._pending[field] = (old, new)
+
+    """Whether a notification is waiting to be sent."""
+    def has_pending(self):
+        return self._pending_all or self._pending is not None
+
+    """Sends the pending notification from the idle scheduler."""
+    def _idle_flush(self):
+        self._flush_scheduled = False
+        self.flush()
+
+    """Sends the pending notification to every interested observer immediately."""
+    def flush(self):
+        if not self.is_running or not self.has_pending():
+            return
+        changes = None
+        if not self._pending_all:
+            # Drop fields that changed and changed back
+            changes = {field: change for field, change in self._pending.items() if change[0] != change[1]}
+        self._pending = None
+        self._pending_all = False
+        if changes == {}:
+            return
+        for observer, fields in list(self._observers):
+            if changes is None or fields is None:
+                observer_changes = changes
+            else:
+                observer_changes = {field: changes[field] for field in fields if field in changes}
+                if not observer_changes:
+                    continue
             try:
-                observer()
-            except tk.TclError:
-                # If we get a TclError, the window was probably destroyed
+                observer(observer_changes)
+            except self._closed_errors:
+                # The window was probably destroyed
                 self.is_running = False
                 break
 
+    """Starts a batch, notifications are held until the matching commit_batch."""
+    def begin_batch(self):
+        self._batch_depth += 1
+
+    """Ends a batch, sending one coalesced notification if anything changed."""
+    def commit_batch(self):
+        if self._batch_depth == 0:
+            return
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self.has_pending():
+            self.notify_observers({})
+
+    """Context manager wrapping begin_batch/commit_batch."""
+    @contextmanager
+    def batch(self):
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.commit_batch()
+
     """Stop the observer and cleanup"""
     def stop(self):
-        self.is_running = False
\ No newline at end of file
+        self.is_running = False
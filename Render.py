@@ -0,0 +1,161 @@
+"""
+Offscreen Rendering System for Tamagotchi Game
+Renders any (action, background, secondary_action) scene to an animated GIF, an APNG or a
+sprite strip without Tk, and renders a whole herd's current states on a process pool.
+
+Usage:
+    python Render.py scene eat 2 --secondary oniguri -o eating.gif
+    python Render.py herd pets.db thumbnails/ --format apng --workers 4
+    python Render.py herd save_file.json thumbnails/
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from Animate import ACTION_MAP, Weather_imgs, composite_frames, get_action_fps, get_background_image, get_sprite_atlas
+
+# Output formats and the file extension each one is written with
+FORMATS = {
+    "gif": ".gif",
+    "apng": ".png",
+    "strip": ".png"
+}
+
+def scene_for_pet(pet_stats, secondary_action=None):
+    """Return the (action, background, secondary_action) scene the game window shows for a pet's stats."""
+    if not pet_stats["is_alive"]:
+        return ("dead", pet_stats["background"], secondary_action)
+    # Poop is only shown if there's no other active secondary action
+    if pet_stats["poop_visible"] and not secondary_action:
+        secondary_action = "poop"
+    return (pet_stats["action"], pet_stats["background"], secondary_action)
+
+def render_frames(action, background, secondary_action=None):
+    """Composite the frames of a scene as PIL images."""
+    if action not in ACTION_MAP:
+        raise ValueError(f"Unknown action: {action}")
+    if not 0 <= background < len(Weather_imgs):
+        raise ValueError(f"Unknown background: {background}")
+    return composite_frames(get_background_image(background), action, secondary_action)
+
+def encode_frames(frames, output_format="gif", fps=None):
+    """Encode frames as an animated GIF, an APNG or a horizontal sprite strip PNG and return the bytes."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format: {output_format}")
+    frames = [frame.convert("RGB") for frame in frames]
+    duration = round(1000 / fps) if fps else 100
+    buffer = io.BytesIO()
+    if output_format == "strip":
+        width, height = frames[0].size
+        strip = Image.new("RGB", (width * len(frames), height))
+        for i, frame in enumerate(frames):
+            strip.paste(frame, (i * width, 0))
+        strip.save(buffer, format="PNG")
+    elif output_format == "gif":
+        frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    else:
+        frames[0].save(buffer, format="PNG", save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    return buffer.getvalue()
+
+def render_scene(scene, output_format="gif"):
+    """Render a scene to encoded bytes, animated at the action's in-game frame rate."""
+    action, background, secondary_action = scene
+    return encode_frames(render_frames(action, background, secondary_action), output_format, get_action_fps(action))
+
+def save_scene(path, action, background, secondary_action=None, output_format=None):
+    """Render a scene to a file, picking the format from the extension unless one is given."""
+    if output_format is None:
+        output_format = "gif" if path.lower().endswith(".gif") else "apng"
+    with open(path, 'wb') as f:
+        f.write(render_scene((action, background, secondary_action), output_format))
+
+def _init_worker():
+    # Slice the sprite sheet once per worker process instead of once per scene
+    get_sprite_atlas().preload()
+
+def pet_file_name(pet_id):
+    """Return pet_id as a file name, with every character but letters, digits, _, - and . replaced by _."""
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(pet_id))
+    # Leading dots would make hidden files, or . and .. themselves
+    return "_" + name[1:] if name.startswith(".") else name or "_"
+
+def render_herd(pets, output_dir, output_format="gif", workers=None):
+    """
+    Render {pet ID: stats} into output_dir/<pet ID><extension> on a process pool, the ID made
+    safe as a file name (see pet_file_name). Pets in the same scene share one render.
+    Returns the number of scenes rendered.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    scenes = {pet_id: scene_for_pet(pet_stats) for pet_id, pet_stats in pets.items()}
+    unique_scenes = sorted(set(scenes.values()), key=repr)
+    if not unique_scenes:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        rendered = dict(zip(unique_scenes, executor.map(render_scene, unique_scenes, [output_format] * len(unique_scenes))))
+    extension = FORMATS[output_format]
+    for pet_id, scene in scenes.items():
+        with open(os.path.join(output_dir, pet_file_name(pet_id) + extension), 'wb') as f:
+            f.write(rendered[scene])
+    return len(unique_scenes)
+
+def load_pets(sources):
+    """Load {pet ID: stats} from SQLite databases (every pet) and JSON save files (keyed by file name)."""
+    pets = {}
+    for path in sources:
+        if path.endswith(".json"):
+            with open(path, 'r') as f:
+                pets[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+        else:
+            # Imported here so rendering save files never needs the database module
+            import sqlite3
+            from Storage import SQLiteStore
+            store = SQLiteStore(path, read_only=True)
+            try:
+                pets.update(store.query_pets())
+            except sqlite3.Error as e:
+                raise ValueError(f"Failed to read pets from {path}: {e}") from None
+            finally:
+                store.close()
+    return pets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Tamagotchi animations without a display.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scene = commands.add_parser("scene", help="render one scene")
+    scene.add_argument("action", choices=list(ACTION_MAP))
+    scene.add_argument("background", type=int, choices=range(len(Weather_imgs)))
+    scene.add_argument("--secondary", choices=list(ACTION_MAP), help="secondary sprite, e.g. oniguri or poop")
+    scene.add_argument("--format", choices=list(FORMATS), help="output format (from the extension by default)")
+    scene.add_argument("-o", "--output", required=True, help="output file")
+
+    herd = commands.add_parser("herd", help="render the current state of every pet")
+    herd.add_argument("sources", nargs="+", help="SQLite databases and/or JSON save files")
+    herd.add_argument("output_dir", help="directory the renders are written to")
+    herd.add_argument("--format", choices=list(FORMATS), default="gif", help="output format")
+    herd.add_argument("--workers", type=int, help="worker processes (one per CPU by default)")
+    args = parser.parse_args(argv)
+
+    if args.command == "scene":
+        save_scene(args.output, args.action, args.background, args.secondary, args.format)
+        print(f"Rendered {args.output}")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        pets = load_pets(args.sources)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    count = render_herd(pets, args.output_dir, args.format, args.workers)
+    print(f"Rendered {len(pets)} pets ({count} distinct scenes) to {args.output_dir} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
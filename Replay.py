@@ -0,0 +1,251 @@
+"""
+Session Record and Replay System for Tamagotchi Game
+Records a Controller's inputs (feed, dance, sleep, dice, clean, rename, reset) and timer events
+(stat updates, animations ending) with their clock offsets, together with the starting stats and
+the pet's random stream. A replay re-runs the session headlessly in virtual time, as fast as
+possible, and reproduces the same stats.
+
+Record a game with TAMAGOTCHI_RECORD=session.json python Run.py, then:
+    python Replay.py session.json                  # replay and check the stats
+    python Replay.py session.json --repeat 20 --trace
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import Trace
+from Clock import Clock, VirtualClock
+from Controller import Controller
+from Model import DataManager
+
+FORMAT_VERSION = 1
+
+# Controller methods scheduled on the clock whose firings are recorded and replayed
+TIMER_EVENTS = ("handle_update", "return_to_idle")
+
+# Recorded input -> Controller method
+INPUTS = {
+    "feed": "feed",
+    "dance": "dance",
+    "sleep": "sleep",
+    "dice": "random_event",
+    "clean": "clean_poop",
+    "rename": "set_name",
+    "reset": "reset_game"
+}
+
+# Pet fields restored before a replay starts
+STATE_FIELDS = ("name", "age", "weight", "mood", "health", "poop_level", "is_alive", "poop_visible", "action", "background")
+
+class RecordingClock(Clock):
+    """Wraps a clock and records when the controller's timer callbacks fire."""
+    def __init__(self, clock, recorder):
+        self.clock = clock
+        self.recorder = recorder
+        self.closed_errors = clock.closed_errors
+
+    def now(self):
+        return self.clock.now()
+
+    def call_later(self, delay, callback):
+        name = getattr(callback, "__name__", None)
+        if name not in TIMER_EVENTS:
+            return self.clock.call_later(delay, callback)
+        def fire():
+            self.recorder.record(name)
+            callback()
+            self.recorder.record_state()
+        return self.clock.call_later(delay, fire)
+
+    def cancel(self, handle):
+        self.clock.cancel(handle)
+
+    def call_idle(self, callback):
+        return self.clock.call_idle(callback)
+
+class SessionRecorder:
+    """Records a controller session. Pass it to Controller(session=...) and save() it when the game ends."""
+    def __init__(self, path=None):
+        """Initialize the recorder, saving to path by default."""
+        self.path = path
+        self.controller = None
+        self.start = 0.0
+        self.initial_state = None
+        self.rng_state = None
+        self.events = []
+
+    def attach(self, controller):
+        """Capture the starting stats and random stream, and return the clock the controller should use."""
+        self.controller = controller
+        self.start = controller.clock.now()
+        pet = controller.pet.get_pet()
+        self.initial_state = {field: pet[field] for field in STATE_FIELDS}
+        self.rng_state = controller.rng.getstate()
+        return RecordingClock(controller.clock, self)
+
+    def record(self, event, *args):
+        """Log an event at the current clock offset."""
+        entry = {"t": self.controller.clock.now() - self.start, "e": event}
+        if args:
+            entry["a"] = list(args)
+        self.events.append(entry)
+
+    def record_state(self):
+        """Attach the stats after the last event, so a replay can check it stayed in step."""
+        if self.events:
+            self.events[-1]["s"] = self.controller.get_pet()
+
+    def to_dict(self):
+        """Return the recording as JSON-serializable data."""
+        version, internal, gauss = self.rng_state
+        return {
+            "version": FORMAT_VERSION,
+            "rng_state": [version, list(internal), gauss],
+            "initial_state": self.initial_state,
+            "events": self.events,
+            "duration": self.controller.clock.now() - self.start if self.controller else 0.0,
+            "final_state": self.controller.get_pet() if self.controller else None
+        }
+
+    def save(self, path=None):
+        """Write the recording to a JSON file."""
+        with open(path or self.path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+def recorder_from_env():
+    """Return a SessionRecorder if TAMAGOTCHI_RECORD names a file to record to, otherwise None."""
+    path = os.environ.get("TAMAGOTCHI_RECORD")
+    return SessionRecorder(path) if path else None
+
+def load_recording(path):
+    """Read a recording written by SessionRecorder.save()."""
+    with open(path, 'r') as f:
+        recording = json.load(f)
+    if recording.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording version: {recording.get('version')}")
+    return recording
+
+class ReplayClock(VirtualClock):
+    """VirtualClock that holds the recorded timer callbacks back until the replayer fires them."""
+    def __init__(self, start=0.0):
+        super().__init__(start)
+        self.held = {name: deque() for name in TIMER_EVENTS}
+
+    def call_later(self, delay, callback):
+        name = getattr(callback, "__name__", None)
+        if name not in self.held:
+            return super().call_later(delay, callback)
+        handle = next(self._ids)
+        self._live.add(handle)
+        self.held[name].append((handle, callback))
+        return handle
+
+    def fire(self, name):
+        """Run the oldest held callback of that name that was not cancelled. Returns False if there is none."""
+        queue = self.held[name]
+        while queue:
+            handle, callback = queue.popleft()
+            if handle not in self._live:
+                continue # Cancelled
+            self._live.discard(handle)
+            callback()
+            return True
+        return False
+
+class MemoryDataManager(DataManager):
+    """DataManager that keeps the save in memory, so replays never touch the disk."""
+    def __init__(self):
+        super().__init__()
+        self.data = None
+
+    def save_data(self, data):
+        self.data = dict(data)
+        return True
+
+    def load_data(self):
+        return dict(self.data) if self.data is not None else dict(self.default_data)
+
+    def reset_data(self):
+        self.data = None
+
+class SessionReplayer:
+    """Replays a recording through a headless Controller in virtual time."""
+    def __init__(self, recording):
+        """Initialize the replayer with a recording from load_recording()."""
+        self.recording = recording
+        self.clock = ReplayClock()
+        self.controller = None
+        self.mismatches = []
+
+    def attach(self, controller):
+        """Restore the recorded starting stats and random stream, and return the replay clock."""
+        pet = controller.pet
+        for field, value in self.recording["initial_state"].items():
+            setattr(pet, field, value)
+        version, internal, gauss = self.recording["rng_state"]
+        controller.rng.setstate((version, tuple(internal), gauss))
+        return self.clock
+
+    def record(self, event, *args):
+        """Inputs made during a replay come from the recording itself, so nothing is logged."""
+
+    def run(self):
+        """Replay every event and return the final stats, event count and stat mismatches."""
+        self.controller = Controller(None, lambda changes: None, self.clock, MemoryDataManager(), session=self)
+        for event in self.recording["events"]:
+            self.clock.advance(max(0.0, event["t"] - self.clock.now()))
+            name = event["e"]
+            if name in TIMER_EVENTS:
+                self.clock.fire(name)
+            else:
+                getattr(self.controller, INPUTS[name])(*event.get("a", []))
+            if "s" in event and self.controller.get_pet() != event["s"]:
+                self.mismatches.append({"t": event["t"], "e": name, "expected": event["s"], "actual": self.controller.get_pet()})
+        self.controller.stop()
+        final_state = self.controller.get_pet()
+        expected = self.recording.get("final_state")
+        return {
+            "events": len(self.recording["events"]),
+            "final_state": final_state,
+            "matches_recording": not self.mismatches and (expected is None or expected == final_state),
+            "mismatches": self.mismatches
+        }
+
+def replay(recording):
+    """Replay a recording once and return the results of SessionReplayer.run()."""
+    return SessionReplayer(recording).run()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Tamagotchi session headlessly.")
+    parser.add_argument("recording", help="JSON file written with TAMAGOTCHI_RECORD")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay (for profiling)")
+    parser.add_argument("--trace", action="store_true", help="trace the hot paths and print the spans")
+    args = parser.parse_args(argv)
+
+    recording = load_recording(args.recording)
+    if args.trace:
+        Trace.enable()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        results = replay(recording)
+    elapsed = time.perf_counter() - start
+    summary = {
+        "events": results["events"],
+        "recorded_seconds": recording.get("duration", 0.0),
+        "replays": args.repeat,
+        "replay_seconds": elapsed / args.repeat,
+        "matches_recording": results["matches_recording"],
+        "mismatches": len(results["mismatches"]),
+        "final_state": results["final_state"]
+    }
+    if args.trace:
+        summary["spans"] = Trace.snapshot()
+    print(json.dumps(summary, indent=4))
+    return 0 if results["matches_recording"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
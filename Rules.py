@@ -0,0 +1,521 @@
+"""
+Stat Rule System for Tamagotchi Game
+Every stat effect in the game (the tick, the poop trigger, moods and the feed, dance, sleep,
+dice, poop and clean actions) is written down once in a declarative rule table. The table is
+validated and compiled once into a RuleSet, which applies a rule to a single pet (the Model)
+or to many rows of a Herd at once with NumPy, so every code path shares one implementation.
+
+A rule has an optional guard ("when"), an optional random roll and a list of steps:
+    {"effects": [...]}                  applied unconditionally
+    {"when": "<condition>", ...}        applied if the condition holds
+    {"cases": [{"when": ..., "effects": [...]}, ..., {"effects": [...]}]}   first match wins
+    {"choose": [{"name": ..., "effects": [...]}, ...]}                      one picked at random
+An effect adds to a stat ({"stat": "health", "add": "-roll//2", "min": 0}) or sets it
+({"stat": "poop_visible", "set": True}). Amounts are integers, params or the roll, optionally
+negated and floor-divided ("-roll//2" is -(roll // 2)). Conditions compare a stat with an
+integer or a param ("weight > overweight"), test a flag ("poop_visible", "not is_alive") and
+can be joined with "or".
+
+Custom tables are JSON files of the same shape as RULES (see load_rules).
+"""
+
+import copy
+import json
+import operator
+import re
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Only needed to apply rules to a herd
+
+#Random value ranges for different actions
+MIN = 3  # Minimum value for interactions (slightly better than base decrease)
+MAX = 5  # Maximum value for interactions (significantly better but not overwhelming)
+
+# Mood names, indexed by the Model's mood constants
+MOODS = ("happy", "middle", "angry", "sad", "dead")
+
+# Stats rules can read and change, and their types
+STAT_TYPES = {
+    "age": int,
+    "weight": int,
+    "health": int,
+    "poop_level": int,
+    "poop_visible": bool,
+    "is_alive": bool,
+    "mood": str
+}
+
+# Rules the game calls by name, every table must define them
+REQUIRED_RULES = ("tick", "poop_check", "poop", "mood", "feed", "dance", "sleep", "dice", "clean")
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+_AMOUNT = re.compile(r"^([+-]?)(\w+)(?://(\d+))?$")
+_COMPARISON = re.compile(r"^(\w+)\s*(<=|>=|==|!=|<|>)\s*(-?\w+)$")
+
+RULES = {
+    "params": {
+        "interaction_min": MIN,
+        "interaction_max": MAX,
+        "overweight": 325, # Heavier pets lose health faster
+        "old_age": 50, # So do older pets
+        "poop_threshold": 75 # Poop level at which the pet poops
+    },
+    "rules": {
+        # One stat update: aging, poop and health/weight decay
+        "tick": {
+            "roll": [1, 2],
+            "steps": [
+                {"effects": [
+                    {"stat": "poop_level", "add": 5, "max": 100},
+                    {"stat": "age", "add": 1}
+                ]},
+                {"cases": [
+                    {"when": "weight > overweight", "effects": [
+                        {"stat": "health", "add": "-roll", "min": 0},
+                        {"stat": "weight", "add": "-roll//2", "min": 0}
+                    ]},
+                    {"when": "age > old_age", "effects": [
+                        {"stat": "health", "add": "-roll", "min": 0},
+                        {"stat": "weight", "add": "-roll//3", "min": 0}
+                    ]},
+                    {"effects": [
+                        {"stat": "health", "add": "-roll//2", "min": 0},
+                        {"stat": "weight", "add": "-roll//4", "min": 0}
+                    ]}
+                ]},
+                # Visible poop hurts
+                {"when": "poop_visible", "effects": [{"stat": "health", "add": -3, "min": 0}]},
+                {"when": "health <= 0 or weight <= 0", "effects": [{"stat": "is_alive", "set": False}]}
+            ]
+        },
+        # Poop appears (and hurts) once the level is high enough
+        "poop_check": {
+            "when": "poop_level >= poop_threshold",
+            "steps": [
+                {"effects": [
+                    {"stat": "poop_visible", "set": True},
+                    {"stat": "health", "add": -3, "min": 0, "max": 100}
+                ]}
+            ]
+        },
+        # The pet poops, the level restarts for the next time
+        "poop": {
+            "steps": [
+                {"effects": [
+                    {"stat": "poop_visible", "set": True},
+                    {"stat": "poop_level", "set": 0}
+                ]}
+            ]
+        },
+        "mood": {
+            "steps": [
+                {"cases": [
+                    {"when": "not is_alive", "effects": [{"stat": "mood", "set": "dead"}]},
+                    {"when": "health >= 75", "effects": [{"stat": "mood", "set": "happy"}]},
+                    {"when": "health >= 50", "effects": [{"stat": "mood", "set": "middle"}]},
+                    {"when": "health >= 25", "effects": [{"stat": "mood", "set": "angry"}]},
+                    {"effects": [{"stat": "mood", "set": "sad"}]}
+                ]}
+            ]
+        },
+        "feed": {
+            "roll": ["interaction_min", "interaction_max"],
+            "steps": [
+                {"effects": [
+                    {"stat": "weight", "add": "roll"},
+                    {"stat": "health", "add": "roll", "min": 0, "max": 100},
+                    {"stat": "poop_level", "add": "roll"}
+                ]}
+            ]
+        },
+        "dance": {
+            "roll": ["interaction_min", "interaction_max"],
+            "steps": [
+                {"effects": [
+                    {"stat": "health", "add": "roll", "min": 0, "max": 100},
+                    {"stat": "poop_level", "add": "-roll"}
+                ]}
+            ]
+        },
+        "sleep": {
+            "roll": ["interaction_min", "interaction_max"],
+            "steps": [
+                {"effects": [
+                    {"stat": "weight", "add": "-roll"},
+                    {"stat": "health", "add": "roll", "min": 0, "max": 100},
+                    {"stat": "poop_level", "add": "roll"}
+                ]}
+            ]
+        },
+        # The pet's reaction to a scenery change, good or bad
+        "dice": {
+            "steps": [
+                {"choose": [
+                    {"name": "fustrated", "effects": [{"stat": "health", "add": "-interaction_max", "min": 0, "max": 100}]},
+                    {"name": "attention", "effects": [{"stat": "health", "add": "-interaction_min", "min": 0, "max": 100}]},
+                    {"name": "look", "effects": [{"stat": "health", "add": "interaction_min", "min": 0, "max": 100}]},
+                    {"name": "dance_reverse", "effects": [{"stat": "health", "add": "interaction_max", "min": 0, "max": 100}]}
+                ]}
+            ]
+        },
+        "clean": {
+            "when": "poop_visible",
+            "steps": [
+                {"effects": [{"stat": "poop_visible", "set": False}]}
+            ]
+        }
+    }
+}
+
+def _resolve(value, params, where):
+    """Return an integer, looking names up in params."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{where}: expected an integer or a param, got {value!r}")
+    if isinstance(value, str):
+        if value not in params:
+            raise ValueError(f"{where}: unknown param {value!r}")
+        return params[value]
+    return value
+
+def _parse_amount(amount, params, where):
+    """Return (sign, uses_roll, value, divisor) for an "add" amount."""
+    if isinstance(amount, int) and not isinstance(amount, bool):
+        return (1, False, amount, 1)
+    match = _AMOUNT.match(amount) if isinstance(amount, str) else None
+    if match is None:
+        raise ValueError(f"{where}: bad amount {amount!r}")
+    sign, name, divisor = match.groups()
+    divisor = int(divisor) if divisor else 1
+    if divisor < 1:
+        raise ValueError(f"{where}: divisor must be positive")
+    sign = -1 if sign == "-" else 1
+    if name == "roll":
+        return (sign, True, 0, divisor)
+    return (sign, False, _resolve(name, params, where) // divisor, 1)
+
+def _parse_condition(text, params, where):
+    """Return a condition as a list of (stat, operator, value) alternatives joined by "or"."""
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"{where}: condition must be a non-empty string")
+    alternatives = []
+    for term in text.split(" or "):
+        term = term.strip()
+        match = _COMPARISON.match(term)
+        if match:
+            stat, symbol, value = match.groups()
+            value = int(value) if value.lstrip("-").isdigit() else _resolve(value, params, where)
+        elif term.startswith("not "):
+            stat, symbol, value = term[4:].strip(), "==", False
+        else:
+            stat, symbol, value = term, "==", True
+        if STAT_TYPES.get(stat) not in (int, bool):
+            raise ValueError(f"{where}: unknown stat {stat!r} in condition")
+        alternatives.append((stat, OPERATORS[symbol], value))
+    return alternatives
+
+def _parse_effect(effect, params, uses_roll, where):
+    """Return (stat, kind, value, low, high) for an effect."""
+    if not isinstance(effect, dict) or set(effect) - {"stat", "add", "set", "min", "max"}:
+        raise ValueError(f"{where}: an effect takes stat, add or set, min and max")
+    stat = effect.get("stat")
+    stat_type = STAT_TYPES.get(stat)
+    if stat_type is None:
+        raise ValueError(f"{where}: unknown stat {stat!r}")
+    if ("add" in effect) == ("set" in effect):
+        raise ValueError(f"{where}: an effect needs exactly one of add or set")
+    if "set" in effect:
+        if "min" in effect or "max" in effect:
+            raise ValueError(f"{where}: min and max only apply to add")
+        value = effect["set"]
+        if stat_type is str:
+            if value not in MOODS:
+                raise ValueError(f"{where}: unknown mood {value!r}")
+            value = MOODS.index(value)
+        elif stat_type is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"{where}: {stat} must be set to true or false")
+        else:
+            value = _resolve(value, params, where)
+        return (stat, "set", value, None, None)
+    if stat_type is not int:
+        raise ValueError(f"{where}: only integer stats can be added to")
+    amount = _parse_amount(effect["add"], params, where)
+    if amount[1] and not uses_roll:
+        raise ValueError(f"{where}: amount uses the roll but the rule has none")
+    low = _resolve(effect["min"], params, where) if "min" in effect else None
+    high = _resolve(effect["max"], params, where) if "max" in effect else None
+    return (stat, "add", amount, low, high)
+
+def _parse_effects(effects, params, uses_roll, where):
+    if not isinstance(effects, list):
+        raise ValueError(f"{where}: effects must be a list")
+    return [_parse_effect(effect, params, uses_roll, f"{where}[{i}]") for i, effect in enumerate(effects)]
+
+def _parse_rule(name, rule, params):
+    """Validate a rule and return it as (guard, roll, steps) with every name resolved."""
+    where = f"rules.{name}"
+    if not isinstance(rule, dict) or set(rule) - {"when", "roll", "steps"}:
+        raise ValueError(f"{where}: a rule takes when, roll and steps")
+    guard = _parse_condition(rule["when"], params, f"{where}.when") if "when" in rule else None
+    roll = None
+    if "roll" in rule:
+        if not isinstance(rule["roll"], list) or len(rule["roll"]) != 2:
+            raise ValueError(f"{where}.roll: expected [low, high]")
+        roll = tuple(_resolve(value, params, f"{where}.roll") for value in rule["roll"])
+        if roll[0] > roll[1]:
+            raise ValueError(f"{where}.roll: low is above high")
+    steps = []
+    chooses = 0
+    for i, step in enumerate(rule.get("steps", [])):
+        step_where = f"{where}.steps[{i}]"
+        if not isinstance(step, dict):
+            raise ValueError(f"{step_where}: a step must be an object")
+        if "choose" in step:
+            chooses += 1
+            if set(step) != {"choose"} or not isinstance(step["choose"], list) or not step["choose"]:
+                raise ValueError(f"{step_where}: choose takes a non-empty list of outcomes")
+            outcomes = []
+            for j, outcome in enumerate(step["choose"]):
+                if not isinstance(outcome, dict) or not isinstance(outcome.get("name"), str):
+                    raise ValueError(f"{step_where}.choose[{j}]: an outcome needs a name")
+                outcomes.append((outcome["name"], _parse_effects(outcome.get("effects", []), params, roll is not None, f"{step_where}.choose[{j}].effects")))
+            steps.append(("choose", outcomes))
+            continue
+        if "cases" in step:
+            if set(step) != {"cases"} or not isinstance(step["cases"], list) or not step["cases"]:
+                raise ValueError(f"{step_where}: cases takes a non-empty list of cases")
+            cases = [(f"{step_where}.cases[{j}]", case) for j, case in enumerate(step["cases"])]
+        else:
+            cases = [(step_where, step)]
+        parsed = []
+        for case_where, case in cases:
+            if not isinstance(case, dict) or set(case) - {"when", "effects"}:
+                raise ValueError(f"{case_where}: a case takes when and effects")
+            condition = _parse_condition(case["when"], params, f"{case_where}.when") if "when" in case else None
+            parsed.append((condition, _parse_effects(case.get("effects", []), params, roll is not None, f"{case_where}.effects")))
+        steps.append(("cases", parsed))
+    if chooses > 1:
+        raise ValueError(f"{where}: a rule can choose only once")
+    return (guard, roll, steps)
+
+def validate_rules(table):
+    """Check a rule table, raising ValueError naming the first problem. Returns the parsed rules."""
+    if not isinstance(table, dict) or set(table) - {"params", "rules"}:
+        raise ValueError("A rule table has params and rules")
+    params = table.get("params", {})
+    for name, value in params.items():
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"params.{name}: expected an integer")
+    rules = table.get("rules", {})
+    missing = [name for name in REQUIRED_RULES if name not in rules]
+    if missing:
+        raise ValueError(f"Missing rules: {', '.join(missing)}")
+    return {name: _parse_rule(name, rule, params) for name, rule in rules.items()}
+
+def load_rules(path):
+    """Read a rule table from a JSON file and validate it."""
+    with open(path, 'r') as f:
+        table = json.load(f)
+    validate_rules(table)
+    return table
+
+# Single pet: conditions and effects read and write the pet's attributes
+
+def _scalar_condition(alternatives):
+    if len(alternatives) == 1:
+        (stat, compare, value), = alternatives
+        return lambda pet: compare(getattr(pet, stat), value)
+    return lambda pet: any(compare(getattr(pet, stat), value) for stat, compare, value in alternatives)
+
+def _scalar_effect(effect):
+    stat, kind, value, low, high = effect
+    if kind == "set":
+        def apply(pet, roll):
+            setattr(pet, stat, value)
+        return apply
+    sign, uses_roll, constant, divisor = value
+    def apply(pet, roll):
+        result = getattr(pet, stat) + (sign * (roll // divisor) if uses_roll else sign * constant)
+        if low is not None and result < low:
+            result = low
+        if high is not None and result > high:
+            result = high
+        setattr(pet, stat, result)
+    return apply
+
+def _scalar_effects(effects):
+    compiled = [_scalar_effect(effect) for effect in effects]
+    def apply(pet, roll):
+        for effect in compiled:
+            effect(pet, roll)
+    return apply
+
+def _compile_scalar(parsed):
+    """Compile a parsed rule into apply(pet, rng), returning its outcome or whether it ran."""
+    guard, roll, steps = parsed
+    guard = _scalar_condition(guard) if guard else None
+    compiled = []
+    for kind, body in steps:
+        if kind == "choose":
+            compiled.append(("choose", [(name, _scalar_effects(effects)) for name, effects in body]))
+        else:
+            compiled.append(("cases", [(_scalar_condition(condition) if condition else None, _scalar_effects(effects)) for condition, effects in body]))
+
+    def apply(pet, rng):
+        if guard is not None and not guard(pet):
+            return False
+        value = rng.randint(*roll) if roll else 0
+        result = True
+        for kind, body in compiled:
+            if kind == "choose":
+                result, effects = rng.choice(body)
+                effects(pet, value)
+                continue
+            for condition, effects in body:
+                if condition is None or condition(pet):
+                    effects(pet, value)
+                    break
+        return result
+    return apply
+
+# Herd: conditions and effects work on the herd's columns for an array of rows
+
+def _batch_condition(alternatives):
+    def test(herd, rows):
+        result = None
+        for stat, compare, value in alternatives:
+            matches = compare(getattr(herd, stat)[rows], value)
+            result = matches if result is None else result | matches
+        return result
+    return test
+
+def _batch_effect(effect):
+    stat, kind, value, low, high = effect
+    if kind == "set":
+        def apply(herd, rows, roll):
+            getattr(herd, stat)[rows] = value
+        return apply
+    sign, uses_roll, constant, divisor = value
+    def apply(herd, rows, roll):
+        column = getattr(herd, stat)
+        result = column[rows] + (sign * (roll // divisor) if uses_roll else sign * constant)
+        if low is not None or high is not None:
+            result = np.clip(result, low, high)
+        column[rows] = result
+    return apply
+
+def _batch_effects(effects):
+    compiled = [_batch_effect(effect) for effect in effects]
+    def apply(herd, rows, roll):
+        if len(rows):
+            for effect in compiled:
+                effect(herd, rows, roll)
+    return apply
+
+def _compile_batch(parsed):
+    """
+    Compile a parsed rule into apply_batch(herd, rows, rng) over an array of row indices.
+    Returns the chosen outcome index per row for a rule that chooses, otherwise a mask of the rows it ran for.
+    """
+    guard, roll, steps = parsed
+    guard = _batch_condition(guard) if guard else None
+    compiled = []
+    for kind, body in steps:
+        if kind == "choose":
+            compiled.append(("choose", [_batch_effects(effects) for name, effects in body]))
+        else:
+            compiled.append(("cases", [(_batch_condition(condition) if condition else None, _batch_effects(effects)) for condition, effects in body]))
+
+    def apply_batch(herd, rows, rng):
+        ran = guard(herd, rows) if guard is not None else np.ones(len(rows), dtype=np.bool_)
+        if guard is not None:
+            rows = rows[ran]
+        values = rng.integers(roll[0], roll[1] + 1, size=len(rows), dtype=np.int32) if roll else None
+        result = ran
+        for kind, body in compiled:
+            if kind == "choose":
+                picks = rng.integers(0, len(body), size=len(rows))
+                for index, effects in enumerate(body):
+                    chosen = picks == index
+                    effects(herd, rows[chosen], values[chosen] if roll else None)
+                result = np.full(len(ran), -1, dtype=np.int64)
+                result[ran] = picks
+                continue
+            remaining = np.ones(len(rows), dtype=np.bool_)
+            for condition, effects in body:
+                matched = remaining if condition is None else remaining & condition(herd, rows)
+                effects(herd, rows[matched], values[matched] if roll else None)
+                if condition is None:
+                    break
+                remaining &= ~matched
+        return result
+    return apply_batch
+
+class RuleSet:
+    """A validated rule table compiled for single pets and for herds."""
+    def __init__(self, table=None, params=None):
+        """
+        Compile a rule table (RULES by default). Params override the table's, e.g.
+        {"overweight": 300} to try a different balance.
+        """
+        table = copy.deepcopy(table if table is not None else RULES)
+        if params:
+            unknown = set(params) - set(table.get("params", {}))
+            if unknown:
+                raise ValueError(f"Unknown params: {', '.join(sorted(unknown))}")
+            table["params"].update(params)
+        self.table = table
+        self.params = dict(table.get("params", {}))
+        parsed = validate_rules(table)
+        self._outcomes = {name: [outcome for kind, body in steps if kind == "choose" for outcome, _ in body]
+                          for name, (guard, roll, steps) in parsed.items()}
+        self._scalar = {name: _compile_scalar(rule) for name, rule in parsed.items()}
+        self._batch = {name: _compile_batch(rule) for name, rule in parsed.items()} if np is not None else None
+
+    def __contains__(self, name):
+        return name in self._scalar
+
+    def outcomes(self, name):
+        """Return the outcome names of a rule that chooses, in order (the batch results index them)."""
+        return list(self._outcomes[name])
+
+    def apply(self, name, pet, rng=None):
+        """
+        Apply a rule to one pet's attributes, drawing from rng (the pet's own stream by default).
+        Returns the chosen outcome's name, or whether the rule's guard let it run.
+        """
+        return self._scalar[name](pet, rng if rng is not None else pet.rng)
+
+    def apply_batch(self, name, herd, rows, rng=None):
+        """
+        Apply a rule to the given rows of a Herd (an index array or a slice), drawing from rng
+        (the herd's stream by default). Returns a mask of the rows the rule ran for, or each
+        row's outcome index (-1 where the guard stopped it) for a rule that chooses.
+        """
+        if self._batch is None:
+            raise RuntimeError("NumPy is required to apply rules to a herd")
+        if not isinstance(rows, np.ndarray) or rows.dtype == np.bool_:
+            rows = np.arange(len(herd))[rows]
+        return self._batch[name](herd, rows, rng if rng is not None else herd.rng)
+
+_rules = None
+_rules_lock = threading.Lock()
+
+def get_rules():
+    """Return the shared RuleSet for the built-in table, compiling it on first use."""
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = RuleSet()
+        return _rules
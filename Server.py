@@ -0,0 +1,420 @@
+"""
+Pet Service for Tamagotchi Game
+Runs the Model/Controller game rules headlessly behind a local asyncio HTTP/JSON API. One event
+loop ticks every loaded pet on its own schedule, pets are stored in a SQLiteStore, and a load
+generator measures the service.
+
+Endpoints:
+    POST /pets                  create a pet, body {"id": optional (letters, digits, _ or -), "name": optional}
+    GET  /pets/<id>             the pet's stats
+    POST /pets/<id>/<action>    feed, dance, sleep, dice or clean (add ?sync=1 to wait for the save)
+    GET  /metrics               service counters
+
+Usage:
+    python Server.py serve --port 8080 --database pets.db
+    python Server.py serve --rules my_rules.json
+    python Server.py load --port 8080 --pets 1000 --concurrency 64 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from Clock import AsyncioClock
+from Controller import Controller
+from Model import SaveWorker
+from Rules import RuleSet, get_rules, load_rules
+from Storage import SQLiteDataManager, SQLiteStore
+
+# Endpoint name -> Controller method
+ACTIONS = {
+    "feed": "feed",
+    "dance": "dance",
+    "sleep": "sleep",
+    "dice": "random_event",
+    "clean": "clean_poop"
+}
+
+MAX_IN_FLIGHT = 512 # Requests handled at once before new ones are turned away with 503
+MAX_PET_QUEUE = 16 # Requests waiting for one pet before new ones are turned away with 429
+COMMIT_INTERVAL = 1.0 # Seconds between writes of the staged pet saves
+MAX_BODY = 64 * 1024 # Largest request body accepted
+PET_ID = re.compile(r"[A-Za-z0-9_-]{1,64}") # IDs a /pets/<id> path can route to, also safe as file names
+
+class PetSession:
+    """A loaded pet: its controller, plus the lock that serializes its requests."""
+    def __init__(self, controller):
+        self.controller = controller
+        self.lock = asyncio.Lock()
+        self.waiting = 0 # Requests queued on the lock
+
+class PetService:
+    """Hosts many pets on one event loop and serves them over HTTP/JSON."""
+    def __init__(self, store, max_in_flight=MAX_IN_FLIGHT, max_pet_queue=MAX_PET_QUEUE, seed=None, rules=None):
+        """
+        Initialize the service for pets stored in a SQLiteStore. A seed gives every pet a repeatable random stream.
+        Every pet follows one compiled RuleSet (the built-in rules by default).
+        """
+        self.store = store
+        self.seed = seed
+        self.rules = rules if rules is not None else get_rules()
+        self.max_in_flight = max_in_flight
+        self.max_pet_queue = max_pet_queue
+        self.sessions = {}
+        self._loading = {} # Pet ID -> store read in progress, shared by concurrent requests
+        self.save_worker = SaveWorker() # One writer thread shared by every pet
+        self.clock = None
+        self.in_flight = 0
+        self.counters = {"requests": 0, "rejected": 0, "throttled": 0, "commits": 0, "commit_errors": 0}
+        self._server = None
+        self._commit_task = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening and committing saves in the background."""
+        self.clock = AsyncioClock(asyncio.get_running_loop())
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        self._commit_task = asyncio.create_task(self._commit_loop())
+        return self._server
+
+    async def stop(self):
+        """Stop serving, stop every pet and write everything still staged."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._commit_task is not None:
+            self._commit_task.cancel()
+        for session in self.sessions.values():
+            session.controller.stop()
+        self.sessions.clear()
+        self.save_worker.stop()
+        self.store.commit()
+
+    async def _commit_loop(self):
+        # Ticks and actions only stage saves, they are written together once per interval
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(COMMIT_INTERVAL)
+            try:
+                if await loop.run_in_executor(None, self.store.commit):
+                    self.counters["commits"] += 1
+            except sqlite3.Error as e:
+                # The saves stay staged, so the next interval retries them
+                print(f"Failed to commit pet saves: {e}")
+                self.counters["commit_errors"] += 1
+
+    def _flush(self):
+        """Write every save queued so far (runs on an executor thread)."""
+        self.save_worker.flush()
+        self.store.commit()
+
+    async def load_session(self, pet_id, create=False):
+        """
+        Return the pet's session, loading the pet from the store if needed, or None for an unknown pet.
+        With create, makes a new pet instead and returns None if it already exists.
+        The store is read on an executor thread, only in-memory work runs on the event loop.
+        """
+        session = self.sessions.get(pet_id)
+        if session is not None:
+            return None if create else session
+        loading = self._loading.get(pet_id)
+        if loading is None:
+            loading = self._loading[pet_id] = asyncio.get_running_loop().run_in_executor(None, self.store.load_pet, pet_id)
+        try:
+            data = await asyncio.shield(loading)
+        finally:
+            if self._loading.get(pet_id) is loading:
+                del self._loading[pet_id]
+        # Another request may have loaded the pet while this one waited
+        session = self.sessions.get(pet_id)
+        if session is not None:
+            return None if create else session
+        if create == (data is not None):
+            return None
+        data_manager = SQLiteDataManager(self.store, pet_id, autocommit=False)
+        data_manager.preload(data if data is not None else data_manager.default_data)
+        # Each pet draws from its own stream, derived from the service seed and the pet ID
+        rng = random.Random(f"{self.seed}:{pet_id}") if self.seed is not None else None
+        controller = Controller(None, lambda changes: None, self.clock, data_manager, self.save_worker, rng, rules=self.rules)
+        session = self.sessions[pet_id] = PetSession(controller)
+        return session
+
+    def pet_state(self, pet_id, session):
+        """Return the pet's stats as sent to clients."""
+        state = session.controller.get_pet()
+        state["id"] = pet_id
+        state["secondary_action"] = session.controller.get_secondary_action()
+        state["is_animating"] = session.controller.is_animating
+        state["queued_actions"] = session.controller.queued_actions
+        return state
+
+    async def create_pet(self, body):
+        """Create a pet, named and keyed as requested."""
+        if not isinstance(body, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "Body must be a JSON object"}
+        pet_id = str(body.get("id") or uuid.uuid4().hex[:12])
+        if not PET_ID.fullmatch(pet_id):
+            return HTTPStatus.BAD_REQUEST, {"error": "Pet IDs are 1 to 64 letters, digits, _ or -"}
+        session = await self.load_session(pet_id, create=True)
+        if session is None:
+            return HTTPStatus.CONFLICT, {"error": f"Pet {pet_id} already exists"}
+        if "name" in body:
+            session.controller.set_name(str(body["name"]))
+        else:
+            session.controller.save_game("create")
+        return HTTPStatus.CREATED, self.pet_state(pet_id, session)
+
+    async def pet_request(self, pet_id, action=None, sync=False):
+        """Run one request for a pet. Requests for the same pet run one at a time, in arrival order."""
+        session = await self.load_session(pet_id)
+        if session is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown pet {pet_id}"}
+        if session.waiting >= self.max_pet_queue:
+            self.counters["throttled"] += 1
+            return HTTPStatus.TOO_MANY_REQUESTS, {"error": f"Too many requests for pet {pet_id}"}
+        session.waiting += 1
+        try:
+            await session.lock.acquire()
+        finally:
+            session.waiting -= 1
+        try:
+            accepted = True
+            if action is not None:
+                controller = session.controller
+                # Like the game's buttons, actions are disabled once the pet has died
+                if not controller.pet.is_alive:
+                    accepted = False
+                else:
+                    # Actions during an animation are queued, they're only refused once the queue is full
+                    accepted = getattr(controller, ACTIONS[action])()
+                if accepted and sync:
+                    await asyncio.get_running_loop().run_in_executor(None, self._flush)
+            state = self.pet_state(pet_id, session)
+        finally:
+            session.lock.release()
+        if not accepted:
+            return HTTPStatus.CONFLICT, dict(state, error=f"Pet {pet_id} can't {action} right now")
+        return HTTPStatus.OK, state
+
+    def metrics(self):
+        """Return the service counters."""
+        ticks = [session.controller.get_tick_metrics()["max_tick_lag"] for session in self.sessions.values()]
+        return dict(self.counters, pets=len(self.sessions), in_flight=self.in_flight,
+                    max_tick_lag=max(ticks, default=0.0))
+
+    async def dispatch(self, method, target, body):
+        """Route a request and return (status, JSON payload)."""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        if parts == ["pets"] and method == "POST":
+            return await self.create_pet(body)
+        if parts == ["metrics"] and method == "GET":
+            return HTTPStatus.OK, self.metrics()
+        if len(parts) == 2 and parts[0] == "pets" and method == "GET":
+            return await self.pet_request(parts[1])
+        if len(parts) == 3 and parts[0] == "pets" and parts[2] in ACTIONS and method == "POST":
+            sync = query.get("sync", ["0"])[0] not in ("", "0")
+            return await self.pet_request(parts[1], parts[2], sync)
+        return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {url.path}"}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection, keeping it open between requests."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    break
+                raw_body = await reader.readexactly(length) if length else b""
+
+                self.counters["requests"] += 1
+                if self.in_flight >= self.max_in_flight:
+                    self.counters["rejected"] += 1
+                    status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Server busy"}
+                else:
+                    self.in_flight += 1
+                    try:
+                        body = json.loads(raw_body) if raw_body else {}
+                        status, payload = await self.dispatch(method, target, body)
+                    except ValueError as e:
+                        status, payload = HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON body: {e}"}
+                    finally:
+                        self.in_flight -= 1
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status.value} {status.phrase}",
+                        "Content-Type: application/json",
+                        f"Content-Length: {len(data)}"]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    head.append("Retry-After: 1")
+                if not keep_alive:
+                    head.append("Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                # Waits while the client is slow to read, so responses never pile up in memory
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host, port, database, seed=None, rules=None):
+    """Run the service until interrupted."""
+    service = PetService(SQLiteStore(database), seed=seed, rules=rules)
+    server = await service.start(host, port)
+    print(f"Serving pets from {database} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        service.store.close()
+
+class HTTPClient:
+    """Minimal keep-alive HTTP/1.1 JSON client used by the load generator."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        """Send a request and return (status, JSON payload), reconnecting if the server closed the connection."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        payload = json.loads(await self.reader.readexactly(int(headers.get("content-length", 0))) or b"null")
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+def percentile(samples, fraction):
+    """Return the given percentile (0-1) of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+async def generate_load(host, port, pets=100, concurrency=32, duration=10.0, read_ratio=0.5, seed=None):
+    """
+    Create pets, then keep concurrency connections busy with a random mix of stat reads and actions
+    for duration seconds. Returns requests per second, latency percentiles and status counts.
+    """
+    rng = random.Random(seed)
+    client = HTTPClient(host, port)
+    pet_ids = []
+    for _ in range(pets):
+        status, payload = await client.request("POST", "/pets", {})
+        if status == HTTPStatus.CREATED:
+            pet_ids.append(payload["id"])
+    client.close()
+    if not pet_ids:
+        raise RuntimeError("No pets could be created")
+
+    latencies = []
+    statuses = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        client = HTTPClient(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                pet_id = rng.choice(pet_ids)
+                if rng.random() < read_ratio:
+                    method, path = "GET", f"/pets/{pet_id}"
+                else:
+                    method, path = "POST", f"/pets/{pet_id}/{rng.choice(list(ACTIONS))}"
+                start = time.perf_counter()
+                status, _ = await client.request(method, path)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "pets": len(pet_ids),
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Tamagotchi pets over HTTP, or load test the service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the pet service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--database", default="pets.db", help="SQLite database the pets are stored in")
+    serve_parser.add_argument("--seed", type=int, help="seed for the pets' random streams")
+    serve_parser.add_argument("--rules", help="JSON rule table to use instead of the built-in one")
+
+    load_parser = commands.add_parser("load", help="run the load generator against a running service")
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=8080)
+    load_parser.add_argument("--pets", type=int, default=100, help="pets to create")
+    load_parser.add_argument("--concurrency", type=int, default=32, help="concurrent connections")
+    load_parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    load_parser.add_argument("--read-ratio", type=float, default=0.5, help="share of requests that read stats")
+    load_parser.add_argument("--seed", type=int, help="random seed")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            rules = RuleSet(load_rules(args.rules)) if args.rules else None
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        try:
+            asyncio.run(serve(args.host, args.port, args.database, args.seed, rules))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    results = asyncio.run(generate_load(args.host, args.port, args.pets, args.concurrency,
+                                        args.duration, args.read_ratio, args.seed))
+    print(json.dumps(results, indent=4))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+SQLite Storage Backend for Tamagotchi Game
+Stores many pets keyed by ID in one database, as an alternative to the single JSON save file.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+from Model import DataManager
+
+# Stat columns stored for every pet, in table order
+PET_FIELDS = ["name", "age", "weight", "mood", "health", "poop_level",
+              "is_alive", "poop_visible", "action", "background", "last_updated"]
+BOOLEAN_FIELDS = ("is_alive", "poop_visible")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pets (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    mood INTEGER NOT NULL,
+    health INTEGER NOT NULL,
+    poop_level INTEGER NOT NULL,
+    is_alive INTEGER NOT NULL,
+    poop_visible INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    background INTEGER NOT NULL,
+    last_updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pets_alive_poop ON pets (is_alive, poop_visible);
+"""
+
+class SQLiteStore:
+    """
+    Multi-pet SQLite database in WAL mode, so readers never block the ticking writer.
+    Saves are staged and written together in one transaction by commit(). Reads go through a
+    read-only connection per thread and see staged saves that are not written yet.
+    """
+    def __init__(self, path="pets.db", read_only=False):
+        """Open (or create) the database at path. Read-only, the database must exist and is never changed."""
+        self.path = path
+        self._write_lock = threading.Lock() # Held for a whole commit, only writers wait on it
+        self._staged_lock = threading.Lock() # Held briefly, never across disk I/O
+        self._staged = {}
+        self._committing = {} # Saves taken from the stage by a commit that is still writing
+        self._readers = threading.local()
+        self._reader_connections = []
+        if read_only:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No such database: {path}")
+            self.connection = sqlite3.connect(self._read_only_uri(), uri=True, check_same_thread=False)
+            return
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def _read_only_uri(self):
+        return f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro"
+
+    def _reader(self):
+        """Return this thread's read-only connection, opening it on first use."""
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._read_only_uri(), uri=True, check_same_thread=False)
+            self._readers.connection = connection
+            with self._staged_lock:
+                self._reader_connections.append(connection)
+        return connection
+
+    def _row_to_pet(self, row):
+        """Convert a database row (without the id) to a stat dictionary."""
+        pet = dict(zip(PET_FIELDS, row))
+        for field in BOOLEAN_FIELDS:
+            pet[field] = bool(pet[field])
+        return pet
+
+    def stage(self, pet_id, data):
+        """Queue a pet's state for the next commit, replacing any earlier staged state."""
+        data = dict(data)
+        data.setdefault("last_updated", time.time())
+        missing = [field for field in PET_FIELDS if field not in data]
+        if missing:
+            raise ValueError(f"Pet {pet_id} state is missing {', '.join(missing)}")
+        with self._staged_lock:
+            self._staged[pet_id] = data
+
+    def staged_pet(self, pet_id):
+        """Return a pet's state saved but not yet written to the database, or None."""
+        with self._staged_lock:
+            data = self._staged.get(pet_id)
+            if data is None:
+                data = self._committing.get(pet_id)
+        return {field: data[field] for field in PET_FIELDS} if data is not None else None
+
+    def commit(self):
+        """Write every staged pet in a single transaction and return how many were written."""
+        with self._write_lock:
+            with self._staged_lock:
+                if not self._staged:
+                    return 0
+                self._committing, self._staged = self._staged, {}
+            placeholders = ", ".join("?" for _ in range(len(PET_FIELDS) + 1))
+            try:
+                rows = [[pet_id] + [data[field] for field in PET_FIELDS] for pet_id, data in self._committing.items()]
+                with self.connection:
+                    self.connection.executemany(
+                        f"INSERT OR REPLACE INTO pets (id, {', '.join(PET_FIELDS)}) VALUES ({placeholders})", rows)
+            except Exception:
+                # Put the saves back unless newer ones were staged meanwhile
+                with self._staged_lock:
+                    self._staged = {**self._committing, **self._staged}
+                    self._committing = {}
+                raise
+            with self._staged_lock:
+                self._committing = {}
+            return len(rows)
+
+    def save_pets(self, pets):
+        """Save a dictionary of pet ID -> state in one transaction."""
+        for pet_id, data in pets.items():
+            self.stage(pet_id, data)
+        return self.commit()
+
+    def load_pet(self, pet_id):
+        """Return a pet's state, including saves not written yet, or None if the pet is unknown."""
+        data = self.staged_pet(pet_id)
+        if data is not None:
+            return data
+        row = self._reader().execute(
+            f"SELECT {', '.join(PET_FIELDS)} FROM pets WHERE id = ?", (pet_id,)).fetchone()
+        return self._row_to_pet(row) if row else None
+
+    def delete_pet(self, pet_id):
+        """Remove a pet from the database."""
+        with self._write_lock:
+            with self._staged_lock:
+                self._staged.pop(pet_id, None)
+            with self.connection:
+                self.connection.execute("DELETE FROM pets WHERE id = ?", (pet_id,))
+
+    def pet_ids(self):
+        """Return the IDs of every stored pet."""
+        return [row[0] for row in self._reader().execute("SELECT id FROM pets ORDER BY id")]
+
+    def query_pets(self, is_alive=None, poop_visible=None):
+        """
+        Return {pet ID: state} for pets matching the given flags, e.g.
+        query_pets(is_alive=True, poop_visible=True) for every living pet with poop to clean.
+        Only written saves are queried, commit() first to include staged ones.
+        """
+        conditions = []
+        values = []
+        for field, value in (("is_alive", is_alive), ("poop_visible", poop_visible)):
+            if value is not None:
+                conditions.append(f"{field} = ?")
+                values.append(int(value))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._reader().execute(
+            f"SELECT id, {', '.join(PET_FIELDS)} FROM pets{where} ORDER BY id", values).fetchall()
+        return {row[0]: self._row_to_pet(row[1:]) for row in rows}
+
+    def close(self):
+        """Commit anything staged and close the database."""
+        self.commit()
+        with self._staged_lock:
+            readers, self._reader_connections = self._reader_connections, []
+        for connection in readers:
+            connection.close()
+        self.connection.close()
+
+class SQLiteDataManager(DataManager):
+    """
+    DataManager for one pet stored in a SQLiteStore, usable as Model(observer, data_manager).
+    With autocommit off, saves are only staged, so a ticker can commit many pets in one transaction.
+    """
+    def __init__(self, store, pet_id, autocommit=True):
+        """Initialize the data manager for the given pet in the store."""
+        super().__init__()
+        self.store = store
+        self.pet_id = pet_id
+        self.autocommit = autocommit
+        self._preloaded = None
+
+    def preload(self, data):
+        """Use data already read from the store for the next load, so loading doesn't touch the database."""
+        self._preloaded = data
+
+    def save_data(self, data):
+        """Stage the pet's state and write it unless commits are batched by the caller."""
+        self.store.stage(self.pet_id, dict(data, last_updated=time.time()))
+        if self.autocommit:
+            try:
+                self.store.commit()
+            except sqlite3.Error as e:
+                print(f"Failed to save game data: {e}")
+                return False
+        return True
+
+    def load_data(self):
+        """Load the pet's state (its latest save, even if not committed yet), or the default data for a new pet."""
+        if self._preloaded is not None:
+            data, self._preloaded = self._preloaded, None
+            return data
+        try:
+            data = self.store.load_pet(self.pet_id)
+        except sqlite3.Error as e:
+            print(f"Failed to load game data: {e}")
+            data = None
+        return data if data is not None else self.default_data
+
+def migrate_json(store, save_file="save_file.json", pet_id=None):
+    """Import a JSON save file into the store, keyed by pet_id (the file name by default)."""
+    with open(save_file, 'r') as f:
+        data = json.load(f)
+    if pet_id is None:
+        pet_id = os.path.splitext(os.path.basename(save_file))[0]
+    state = dict(DataManager().default_data)
+    state.update({field: data[field] for field in PET_FIELDS if field in data})
+    state.setdefault("last_updated", os.path.getmtime(save_file))
+    store.save_pets({pet_id: state})
+    return pet_id
+
+if __name__ == "__main__":
+    # Usage: python Storage.py pets.db save_file.json [more save files...]
+    if len(sys.argv) < 3:
+        print("Usage: python Storage.py DATABASE SAVE_FILE [SAVE_FILE ...]")
+        sys.exit(1)
+    database = SQLiteStore(sys.argv[1])
+    for path in sys.argv[2:]:
+        print(f"Imported {path} as {migrate_json(database, path)}")
+    database.close()
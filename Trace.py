@@ -0,0 +1,158 @@
+"""
+Hot-Path Tracing System for Tamagotchi Game
+Records span counts and durations in an in-process registry. Tracing is off unless
+TAMAGOTCHI_TRACE=1 is set or enable() is called, and costs one flag check per call when off.
+Set TAMAGOTCHI_TRACE_FILE to dump the registry as JSON when the program exits.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Durations kept per span for percentiles, and the window used for rates
+MAX_SAMPLES = 2048
+RATE_WINDOW = 1.0
+
+_enabled = os.environ.get("TAMAGOTCHI_TRACE", "") not in ("", "0")
+
+class SpanStats:
+    """Count, total and recent durations (seconds) for one span name. Spans may be recorded from any thread."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.ends = deque() # End times inside the rate window
+
+    def record(self, duration, end):
+        """Record one finished span."""
+        with self._lock:
+            self.count += 1
+            self.total += duration
+            self.last = duration
+            self.samples.append(duration)
+            self.ends.append(end)
+            while self.ends and end - self.ends[0] > RATE_WINDOW:
+                self.ends.popleft()
+
+    def percentile(self, fraction):
+        """Return the given percentile (0-1) of the recent durations in seconds."""
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    def rate(self, now=None):
+        """Return how many spans finished per second over the rate window."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            while self.ends and now - self.ends[0] > RATE_WINDOW:
+                self.ends.popleft()
+            return len(self.ends) / RATE_WINDOW
+
+    def to_dict(self):
+        """Summarize the span in milliseconds."""
+        with self._lock:
+            count, total = self.count, self.total
+        return {
+            "count": count,
+            "total_ms": total * 1000,
+            "mean_ms": total * 1000 / count if count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000
+        }
+
+registry = {}
+_registry_lock = threading.Lock()
+
+def is_enabled():
+    """Return whether tracing is on."""
+    return _enabled
+
+def enable():
+    """Turn tracing on."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    """Turn tracing off (recorded data is kept)."""
+    global _enabled
+    _enabled = False
+
+def reset():
+    """Forget every recorded span."""
+    registry.clear()
+
+def get_stats(name):
+    """Return the SpanStats for a span name, creating it if needed."""
+    stats = registry.get(name)
+    if stats is None:
+        with _registry_lock:
+            stats = registry.get(name)
+            if stats is None:
+                stats = registry[name] = SpanStats()
+    return stats
+
+def record(name, duration):
+    """Record a span that was timed elsewhere."""
+    get_stats(name).record(duration, time.perf_counter())
+
+class span:
+    """Context manager timing a block under a span name (a no-op while tracing is off)."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            end = time.perf_counter()
+            get_stats(self.name).record(end - self.start, end)
+        return False
+
+def traced(name):
+    """Decorator timing every call of a function under a span name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                get_stats(name).record(end - start, end)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """Return every span's summary as a dictionary."""
+    with _registry_lock:
+        spans = sorted(registry.items())
+    return {name: stats.to_dict() for name, stats in spans}
+
+def dump(path):
+    """Write the registry summary to a JSON file."""
+    with open(path, 'w') as f:
+        json.dump({"timestamp": time.time(), "spans": snapshot()}, f, indent=4)
+
+def _dump_on_exit():
+    path = os.environ.get("TAMAGOTCHI_TRACE_FILE")
+    if path and registry:
+        dump(path)
+
+atexit.register(_dump_on_exit)
@@ -1,8 +1,10 @@
 import tkinter
 import customtkinter as ctk
-from PIL import Image
 from Controller import Controller
-from Animate import SpriteAnimator
+from Animate import SpriteAnimator, ASSET_LAYOUT, FRAME_BUILD_SPAN, shutdown_asset_loader
+from AssetRegistry import get_asset_registry
+import Trace
+import Replay
 
 #Mood Image paths to be set based off stats.
 mood_imgs = [
@@ -29,6 +31,13 @@ button_imgs = [
     "Assets/Buttons/oniguri.png"
 ]
 
+#Images shown at a fixed size, pre-scaled by the asset cache build (python AssetCache.py)
+CACHED_IMAGES = (
+    [(bg_imgs[1], (300, 400)), (bg_imgs[0], (60, 60)), (bg_imgs[0], (200, 150)), (bg_imgs[0], (35, 35))]
+    + [(path, (30, 30)) for path in mood_imgs]
+    + [(path, (35, 35)) for path in button_imgs]
+)
+
 #Font and colors
 font = ("Andale Mono", 10)
 text_color = "black"
@@ -41,8 +50,13 @@ class View:
     def __init__(self):
         self.ui_initialized = False  # To prevent updates before UI is created
         self.app = ctk.CTk() #create the main app object
-        self.controller = Controller(self.app, self.update_view) #create the controller
+        self.assets = get_asset_registry(ASSET_LAYOUT) # Shared images, each file is decoded once
+        self.recorder = Replay.recorder_from_env() # Records the session when TAMAGOTCHI_RECORD is set
+        self.controller = Controller(self.app, self.update_view, session=self.recorder) #create the controller
         self.action_buttons = [] # Store button references
+        self.overlay = None # Performance overlay label, shown with F3
+        self.overlay_timer = None # Track the overlay refresh timer
+        self.overlay_traces = False # Whether showing the overlay turned tracing on
         self.create_ui() #Create the main app window
         self.show_start_menu() #Show the start menu
 
@@ -57,9 +71,13 @@ class View:
                     # Save and stop before destroying window
                     self.controller.save_game()  # Save current game state
                     self.controller.stop()       # Stop any running updates
+                    if self.recorder is not None:
+                        self.recorder.save()
+                        print(f"Session recorded to {self.recorder.path}")
                     print("Game stopped successfully")
                 except Exception as e:
                     print(f"Error during cleanup: {str(e)}")
+            shutdown_asset_loader() # Stop decoding and compositing ahead for a closed window
                 
     """ Creates general UI elements and initializes the main application window. """
     def create_ui(self):
@@ -67,9 +85,10 @@ class View:
         self.app.geometry("300x400")
         self.app.title("Tamagotchi")
         self.app.resizable(False, False)  # Lock both width and height
+        self.app.bind("<F3>", self.toggle_overlay) # Toggle the performance overlay
         
         # Set background image
-        my_image = ctk.CTkImage(Image.open(bg_imgs[1]), size=(300,400))
+        my_image = self.assets.acquire_ctk_image(bg_imgs[1], (300, 400))
         image_label = ctk.CTkLabel(self.app, image=my_image, text="")
         image_label.pack(padx=0, pady=0)
 
@@ -113,10 +132,10 @@ class View:
         logo_frame.place(relx=0.5, rely=0.11, anchor="center")
         
         # Add game logo to the logo box
-        logo_image = ctk.CTkImage(Image.open(bg_imgs[0]), size=(60, 60))
+        self.start_logo_image = self.assets.acquire_ctk_image(bg_imgs[0], (60, 60))
         logo_label = ctk.CTkLabel(
             logo_frame,
-            image=logo_image,
+            image=self.start_logo_image,
             text="",
             bg_color=button_color
         )
@@ -206,6 +225,7 @@ class View:
     """ Starts the game and removes the start menu. """
     def start_game(self, start_frame):
         start_frame.destroy()
+        self.assets.release(self.start_logo_image)
         self.create_game_ui()
         self.update_view()
 
@@ -227,8 +247,8 @@ class View:
         self.weight = self.make_labels(f"Lbs:{pet_stats['weight']}", 0.695, 0.124, font, text_color, background_label_color, 25, 14)
 
         # Create mood image and health bar
-        mood_image = ctk.CTkImage(Image.open(mood_imgs[pet_stats["mood"]]),size=(30,30))
-        self.mood_image = ctk.CTkLabel(self.app, image=mood_image, text="", bg_color=background_label_color,)
+        self.mood_ctk_image = self.assets.acquire_ctk_image(mood_imgs[pet_stats["mood"]], (30, 30))
+        self.mood_image = ctk.CTkLabel(self.app, image=self.mood_ctk_image, text="", bg_color=background_label_color,)
         self.mood_image.place(relx=0.85, rely=0.105, anchor="center")
         self.health_bar = ctk.CTkProgressBar(self.app, width=100, height=10, corner_radius=0, 
                                         fg_color=button_color, progress_color="dark green")
@@ -249,25 +269,83 @@ class View:
             
         self.ui_initialized = True  # Set flag after UI is created
 
-    """ Updates the view with the current pet stats. Used as the observer callback. """
-    def update_view(self):
+    """ Shows or hides the performance overlay (FPS, frame-build time, notifications per second). """
+    def toggle_overlay(self, event=None):
+        if self.overlay is not None:
+            if self.overlay_timer:
+                self.app.after_cancel(self.overlay_timer)
+                self.overlay_timer = None
+            self.overlay.destroy()
+            self.overlay = None
+            if self.overlay_traces:
+                Trace.disable()
+            return
+        # The overlay is driven by the trace registry, so tracing is on while it shows,
+        # unless it was already on for the whole session (TAMAGOTCHI_TRACE)
+        self.overlay_traces = not Trace.is_enabled()
+        Trace.enable()
+        self.overlay = ctk.CTkLabel(
+            self.app,
+            text="",
+            font=("Andale Mono", 9),
+            text_color="white",
+            fg_color="black",
+            height=14
+        )
+        self.overlay.place(relx=0.5, rely=0.19, anchor="center")
+        self.refresh_overlay()
+
+    """ Refreshes the performance overlay twice a second while it is shown. """
+    def refresh_overlay(self):
+        if self.overlay is None:
+            return
+        fps = Trace.get_stats("animator.animate").rate()
+        frame_build_ms = Trace.get_stats(FRAME_BUILD_SPAN).last * 1000
+        notifications = Trace.get_stats("observer.notify").rate()
+        self.overlay.configure(text=f"FPS {fps:.0f} | build {frame_build_ms:.1f}ms | notify {notifications:.0f}/s")
+        self.overlay_timer = self.app.after(500, self.refresh_overlay)
+
+    """
+        Updates the view with the current pet stats. Used as the observer callback.
+        Changes maps field names to (old, new) values, only widgets showing those fields are updated.
+        When changes is None every widget is refreshed.
+    """
+    @Trace.traced("view.update_view")
+    def update_view(self, changes=None):
         if not self.ui_initialized:  # Only update if UI is initialized
             return
         
+        # Returns whether any of the given fields changed
+        def changed(*fields):
+            return changes is None or any(field in changes for field in fields)
+
         # Get pet stats
         pet_stats = self.controller.get_pet()
 
         # Update labels
-        self.name.configure(text=pet_stats["name"])
-        self.age.configure(text=f"Yrs:{pet_stats['age']}")
-        self.weight.configure(text=f"Lbs:{pet_stats['weight']}")
-        mood_image = ctk.CTkImage(Image.open(mood_imgs[pet_stats["mood"]]), size=(30,30))
-        self.mood_image.configure(image=mood_image)
-        self.health_bar.set(pet_stats["health"] / 100)
+        if changed("name"):
+            self.name.configure(text=pet_stats["name"])
+        if changed("age"):
+            self.age.configure(text=f"Yrs:{pet_stats['age']}")
+        if changed("weight"):
+            self.weight.configure(text=f"Lbs:{pet_stats['weight']}")
+        if changed("mood"):
+            # Mood images are shared, so switching back and forth never reopens a file
+            mood_image = self.assets.acquire_ctk_image(mood_imgs[pet_stats["mood"]], (30, 30))
+            self.mood_image.configure(image=mood_image)
+            self.assets.release(self.mood_ctk_image)
+            self.mood_ctk_image = mood_image
+        if changed("health"):
+            self.health_bar.set(pet_stats["health"] / 100)
         
         # Update button states and sprite based on pet's status
-        self.update_button_states(pet_stats["is_alive"])
+        if changed("is_alive"):
+            self.update_button_states(pet_stats["is_alive"])
         
+        # Skip the sprite pipeline unless something it draws changed
+        if not changed("action", "background", "secondary_action", "poop_visible", "is_alive"):
+            return
+
         if not pet_stats["is_alive"]:
             self.sprite_animator.set_action("dead", pet_stats["background"], self.controller.get_secondary_action())
         else:
@@ -281,6 +359,11 @@ class View:
             # Set the sprite animator action
             self.sprite_animator.set_action(pet_stats["action"], pet_stats["background"], secondary_action)
 
+            # Prepare the scenes that are likely to follow a scenery change
+            if changes is None or "background" in changes:
+                poop = "poop" if pet_stats["poop_visible"] else None
+                self.sprite_animator.prefetch([(action, background, poop) for action, background in self.controller.predict_next_scenes()])
+
     """ Updates the state of all action buttons based on pet's status. """    
     def update_button_states(self, is_alive=True):
         for button in self.action_buttons:
@@ -305,7 +388,7 @@ class View:
     
     """ Makes interaction buttons with the given text, position, and command. """
     def make_interaction_buttons(self, cmd, relx, rely, image_path=None, border=None, size=None):
-        interaction_button_image = ctk.CTkImage(Image.open(image_path), size=(size, size))
+        interaction_button_image = self.assets.acquire_ctk_image(image_path, (size, size))
         new_interaction_button = ctk.CTkButton(
             self.app,
             text="",
@@ -341,8 +424,8 @@ class View:
 
     """ Handles clicks on the sprite area to clean up poop. """
     def handle_poop_click(self, event):
-        if self.controller.clean_poop():
-            self.update_view()
+        # The model notifies the view once the poop is cleaned
+        self.controller.clean_poop()
 
     """ Shows a dialog to change the name of the tamagotchi. """
     def show_name_dialog(self):
@@ -360,12 +443,14 @@ class View:
         settings_window.geometry("200x150")
         settings_window.title("Settings")
         settings_window.resizable(False, False) 
-        my_image = ctk.CTkImage(Image.open(bg_imgs[0]), size=(200,150))
+        my_image = self.assets.acquire_ctk_image(bg_imgs[0], (200, 150))
         image_label = ctk.CTkLabel(settings_window, image=my_image, text="")
         image_label.pack(padx=0, pady=0)
+        # Give the image back when the window closes (child widgets report their own Destroy events too)
+        settings_window.bind("<Destroy>", lambda event: self.assets.release(my_image) if event.widget is settings_window else None)
 
         # Make settings buttons
-        self.make_settings_buttons("New Game", 0.5, 0.2, settings_window, lambda: [self.controller.reset_game(), self.update_view(), settings_window.destroy()])
+        self.make_settings_buttons("New Game", 0.5, 0.2, settings_window, lambda: [self.controller.reset_game(), settings_window.destroy()])
         self.make_settings_buttons("Save Game", 0.5, 0.5, settings_window, lambda: [self.controller.save_game(), self.update_view(), settings_window.destroy()])
         self.make_settings_buttons("Change Name", 0.5, 0.8, settings_window, lambda: [self.show_name_dialog(), settings_window.destroy()])
 
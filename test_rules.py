@@ -0,0 +1,247 @@
+"""
+Rule table checks: the compiled rules must match the stat formulas the game used before they
+were written down as a table, for a single pet (Model.apply_rule) and for a Herd (apply_batch),
+drawing the same random numbers in the same order.
+
+Run with: python -m pytest -q
+"""
+
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from Herd import Herd
+from Model import DataManager, Model
+from Replay import MemoryDataManager
+from Rules import MAX, MIN, MOODS, RuleSet
+
+DICE = {"fustrated": -MAX, "attention": -MIN, "look": MIN, "dance_reverse": MAX}
+
+# Stats around every edge: clamping at 0 and 100, death at 0, the overweight, old age and poop thresholds
+STATES = [
+    dict(age=1, weight=250, health=100, poop_level=0, poop_visible=False),
+    dict(age=60, weight=250, health=50, poop_level=74, poop_visible=True),
+    dict(age=10, weight=400, health=2, poop_level=75, poop_visible=False),
+    dict(age=51, weight=1, health=1, poop_level=98, poop_visible=True),
+    dict(age=50, weight=326, health=99, poop_level=100, poop_visible=False),
+    dict(age=5, weight=325, health=0, poop_level=3, poop_visible=True),
+    dict(age=5, weight=0, health=30, poop_level=80, poop_visible=False),
+    dict(age=5, weight=100, health=3, poop_level=1, poop_visible=True)
+]
+
+def _pet(state):
+    return dict(DataManager().default_data, **state)
+
+# Baseline formulas, as Model.update_stats and the Controller actions applied them
+
+def baseline_tick(pet, decrease):
+    pet["poop_level"] = min(100, pet["poop_level"] + 5)
+    pet["age"] += 1
+    if pet["weight"] > 325:
+        pet["health"] = max(0, pet["health"] - decrease)
+        pet["weight"] = max(0, pet["weight"] - decrease // 2)
+    elif pet["age"] > 50:
+        pet["health"] = max(0, pet["health"] - decrease)
+        pet["weight"] = max(0, pet["weight"] - decrease // 3)
+    else:
+        pet["health"] = max(0, pet["health"] - decrease // 2)
+        pet["weight"] = max(0, pet["weight"] - decrease // 4)
+    if pet["poop_visible"]:
+        pet["health"] = max(0, pet["health"] - 3)
+    if pet["health"] <= 0 or pet["weight"] <= 0:
+        pet["is_alive"] = False
+
+def baseline_poop_check(pet):
+    if pet["poop_level"] >= 75:
+        pet["poop_visible"] = True
+        pet["health"] = max(0, pet["health"] - 3)
+        return True
+    return False
+
+def baseline_poop(pet):
+    pet["poop_visible"] = True
+    pet["poop_level"] = 0
+
+def baseline_feed(pet, increase):
+    pet["weight"] += increase
+    pet["health"] = max(0, min(100, pet["health"] + increase))
+    pet["poop_level"] += increase
+
+def baseline_dance(pet, increase):
+    pet["health"] = max(0, min(100, pet["health"] + increase))
+    pet["poop_level"] -= increase
+
+def baseline_sleep(pet, increase):
+    pet["weight"] -= increase
+    pet["health"] = max(0, min(100, pet["health"] + increase))
+    pet["poop_level"] += increase
+
+def baseline_dice(pet, change):
+    pet["health"] = max(0, min(100, pet["health"] + change))
+
+def baseline_clean(pet):
+    if pet["poop_visible"]:
+        pet["poop_visible"] = False
+        return True
+    return False
+
+def baseline_mood(pet):
+    if not pet["is_alive"]:
+        return MOODS.index("dead")
+    for band, mood in ((75, "happy"), (50, "middle"), (25, "angry")):
+        if pet["health"] >= band:
+            return MOODS.index(mood)
+    return MOODS.index("sad")
+
+def baseline(name, pet, rng):
+    """Apply a baseline formula to a pet dict, drawing from rng like the rule does. Returns the rule's result."""
+    if name == "tick":
+        return baseline_tick(pet, rng.randint(1, 2))
+    if name in ("feed", "dance", "sleep"):
+        return globals()[f"baseline_{name}"](pet, rng.randint(MIN, MAX))
+    if name == "dice":
+        outcome, change = rng.choice(list(DICE.items()))
+        baseline_dice(pet, change)
+        return outcome
+    return globals()[f"baseline_{name}"](pet)
+
+def _stats(pet):
+    return {stat: pet[stat] for stat in ("age", "weight", "health", "poop_level", "poop_visible", "is_alive")}
+
+@pytest.fixture
+def model():
+    model = Model(lambda changes=None: None, data_manager=MemoryDataManager(), rng=random.Random(0))
+    yield model
+    model.stop()
+
+@pytest.mark.parametrize("name", ["tick", "poop_check", "poop", "feed", "dance", "sleep", "dice", "clean"])
+@pytest.mark.parametrize("state", STATES)
+def test_apply_rule_matches_baseline(model, name, state):
+    for seed in range(20):
+        expected = _pet(state)
+        model._set_fields(**_stats(_pet(state)))
+        model.rng = random.Random(seed)
+        result = model.apply_rule(name)
+        expected_result = baseline(name, expected, random.Random(seed))
+        assert _stats(model.get_pet()) == _stats(expected), seed
+        if expected_result is not None:
+            assert result == expected_result
+
+@pytest.mark.parametrize("state", STATES)
+def test_mood_bands(model, state):
+    pet = _pet(state)
+    model._set_fields(**_stats(pet))
+    model.set_mood()
+    assert model.get_pet()["mood"] == baseline_mood(pet)
+
+def test_tick_death_and_poop_threshold():
+    rules = RuleSet()
+    pet = SimpleNamespace(**_pet(dict(health=1, poop_visible=True, poop_level=69)))
+    rules.apply("tick", pet, random.Random(0))
+    assert (pet.health, pet.is_alive) == (0, False)
+    assert pet.poop_level == 74 and rules.apply("poop_check", pet, random.Random(0)) is False
+    pet.poop_level = 75
+    assert rules.apply("poop_check", pet, random.Random(0)) is True
+    assert (pet.poop_visible, pet.health) == (True, 0)
+
+    pet = SimpleNamespace(**_pet(dict(weight=0, health=100)))
+    rules.apply("tick", pet, random.Random(0))
+    assert (pet.weight, pet.is_alive) == (0, False)
+
+def test_clean_needs_visible_poop():
+    rules = RuleSet()
+    pet = SimpleNamespace(poop_visible=False)
+    assert rules.apply("clean", pet, random.Random(0)) is False
+    pet.poop_visible = True
+    assert rules.apply("clean", pet, random.Random(0)) is True and pet.poop_visible is False
+
+def test_params_move_thresholds():
+    pet = SimpleNamespace(**_pet(dict(poop_level=60)))
+    assert RuleSet(params={"poop_threshold": 60}).apply("poop_check", pet, random.Random(0)) is True
+    with pytest.raises(ValueError):
+        RuleSet(params={"no_such_param": 1})
+
+# Herd: the same formulas vectorized, drawing from the same NumPy generator calls
+
+def _herd(seed, copies=50):
+    return Herd.from_states([_pet(state) for state in STATES] * copies, seed=seed)
+
+def _columns(herd):
+    return {stat: getattr(herd, stat).copy() for stat in ("age", "weight", "health", "poop_level", "poop_visible", "is_alive")}
+
+def _expected(herd, rows, apply):
+    """Run a baseline formula over each of the given rows of a copy of the herd's columns."""
+    columns = _columns(herd)
+    results = []
+    for i, row in enumerate(rows):
+        pet = {stat: column[row].item() for stat, column in columns.items()}
+        results.append(apply(pet, i))
+        for stat, column in columns.items():
+            column[row] = pet[stat]
+    return columns, results
+
+def _assert_columns(herd, columns):
+    for stat, column in _columns(herd).items():
+        np.testing.assert_array_equal(column, columns[stat], err_msg=stat)
+
+@pytest.mark.parametrize("name", ["feed", "dance", "sleep"])
+def test_apply_batch_interactions(name):
+    herd = _herd(1)
+    rows = np.arange(0, len(herd), 3)
+    increases = np.random.default_rng(1).integers(MIN, MAX + 1, size=len(rows), dtype=np.int32)
+    columns, _ = _expected(herd, rows, lambda pet, i: globals()[f"baseline_{name}"](pet, int(increases[i])))
+    herd.rules.apply_batch(name, herd, rows)
+    _assert_columns(herd, columns)
+
+def test_apply_batch_dice():
+    herd = _herd(2)
+    rows = np.arange(len(herd))
+    picks = np.random.default_rng(2).integers(0, len(DICE), size=len(rows))
+    changes = list(DICE.values())
+    columns, _ = _expected(herd, rows, lambda pet, i: baseline_dice(pet, changes[picks[i]]))
+    outcomes = herd.rules.apply_batch("dice", herd, rows)
+    _assert_columns(herd, columns)
+    np.testing.assert_array_equal(outcomes, picks)
+    assert herd.rules.outcomes("dice") == list(DICE)
+
+def test_apply_batch_tick_poop_and_clean():
+    herd = _herd(3)
+    rows = herd._rows(slice(None))
+    living = rows[herd.is_alive[rows]]
+    decreases = np.random.default_rng(3).integers(1, 3, size=len(living), dtype=np.int32)
+    columns, _ = _expected(herd, living, lambda pet, i: baseline_tick(pet, int(decreases[i])))
+    herd.rules.apply_batch("tick", herd, living)
+    _assert_columns(herd, columns)
+
+    columns, pooping = _expected(herd, living, lambda pet, i: baseline_poop_check(pet))
+    ran = herd.rules.apply_batch("poop_check", herd, living)
+    _assert_columns(herd, columns)
+    np.testing.assert_array_equal(ran, pooping)
+
+    columns, _ = _expected(herd, living[ran], lambda pet, i: baseline_poop(pet))
+    herd.rules.apply_batch("poop", herd, living[ran])
+    _assert_columns(herd, columns)
+
+    columns, cleaned = _expected(herd, rows, lambda pet, i: baseline_clean(pet))
+    ran = herd.rules.apply_batch("clean", herd, rows)
+    _assert_columns(herd, columns)
+    np.testing.assert_array_equal(ran, cleaned)
+
+def test_herd_update_stats_matches_model():
+    """A herd tick (tick, poop trigger, mood) gives the same stats as ticking each pet with the same rolls."""
+    herd = _herd(4, copies=20)
+    before = _columns(herd)
+    herd.update_stats()
+    rng = np.random.default_rng(4)
+    living = np.flatnonzero(before["is_alive"])
+    decreases = dict(zip(living, rng.integers(1, 3, size=len(living), dtype=np.int32)))
+    for row in range(len(herd)):
+        pet = {stat: column[row].item() for stat, column in before.items()}
+        if pet["is_alive"]:
+            baseline_tick(pet, int(decreases[row]))
+            if baseline_poop_check(pet):
+                baseline_poop(pet)
+        assert {stat: getattr(herd, stat)[row].item() for stat in pet} == pet, row
+        assert herd.mood[row] == baseline_mood(pet)